@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class AnswerCache:
+    """Семантический кэш ответов LLM для /news-chat.
+
+    Ключ — нормализованный эмбеддинг запроса. Попадание требует косинусного
+    сходства не ниже similarity_threshold и того же набора найденных
+    источников. Записи живут ttl секунд, размер ограничен max_entries
+    (вытесняются давно не использованные). При загрузке новых статей
+    invalidate() удаляет записи, чей результат поиска мог измениться.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, ttl: float = 900, max_entries: int = 256):
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def _drop_expired(self, now: float):
+        expired = [key for key, entry in self._entries.items() if entry["expires_at"] <= now]
+        for key in expired:
+            del self._entries[key]
+        self._stats["expired"] += len(expired)
+
+    @staticmethod
+    def _ids(ids) -> frozenset:
+        # id источников приходят и как int (news.id), и как str (id узлов LlamaIndex)
+        return frozenset(str(db_id) for db_id in ids)
+
+    def get(self, query_embedding: np.ndarray, source_ids) -> dict:
+        source_ids = self._ids(source_ids)
+        with self._lock:
+            self._drop_expired(time.monotonic())
+            for key, entry in self._entries.items():
+                if entry["source_ids"] != source_ids:
+                    continue
+                if float(np.dot(entry["query_embedding"], query_embedding)) >= self.similarity_threshold:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return dict(entry["answer"])
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, query_embedding: np.ndarray, source_ids, answer: dict, min_similarity: float):
+        """min_similarity — наименьшее сходство среди найденных источников (порог входа в top-k)."""
+        with self._lock:
+            self._entries[self._next_key] = {
+                "query_embedding": np.asarray(query_embedding, dtype=np.float32),
+                "source_ids": self._ids(source_ids),
+                "answer": dict(answer),
+                "min_similarity": min_similarity,
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, vectors: np.ndarray, ids) -> int:
+        """Удаляет записи, в выдачу которых попали бы новые векторы или изменённые статьи."""
+        ids = self._ids(ids)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not vectors.size:
+            vectors = None
+        with self._lock:
+            stale = []
+            for key, entry in self._entries.items():
+                if entry["source_ids"] & ids:
+                    stale.append(key)
+                elif vectors is not None and float(np.max(vectors @ entry["query_embedding"])) > entry["min_similarity"]:
+                    stale.append(key)
+            for key in stale:
+                del self._entries[key]
+            self._stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_cache = AnswerCache()
+
+
+def get_answer_cache() -> AnswerCache:
+    return _cache
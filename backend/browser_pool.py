@@ -0,0 +1,171 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+logger = logging.getLogger("browser_pool")
+
+ARTICLE_SELECTOR = 'div.article__body, article, div[class*="article"], div[class*="content"]'
+
+
+def create_chrome_driver():
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--enable-unsafe-swiftshader")  # Подавление ошибок WebGL
+    return webdriver.Chrome(options=options)
+
+
+class BrowserPool:
+    """Ограниченный пул долгоживущих headless-браузеров.
+
+    Браузер выдаётся через checkout() и возвращается в пул по выходу из
+    контекста. Браузер пересоздаётся после max_pages страниц или после
+    падения (любая WebDriverException, кроме таймаута страницы).
+    driver_factory позволяет подменить способ запуска браузера.
+    """
+
+    def __init__(self, size: int = 3, max_pages: int = 50, page_timeout: float = 15,
+                 wait_timeout: float = 10, checkout_timeout: float = 60,
+                 driver_factory=create_chrome_driver):
+        self.size = size
+        self.max_pages = max_pages
+        self.page_timeout = page_timeout
+        self.wait_timeout = wait_timeout
+        self.checkout_timeout = checkout_timeout
+        self.driver_factory = driver_factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._closed = False
+        self._stats = {
+            "created": 0,
+            "recycled": 0,
+            "crashed": 0,
+            "pages_served": 0,
+            "page_timeouts": 0,
+            "checkout_wait_seconds": 0.0,
+        }
+
+    def _new_driver(self):
+        driver = self.driver_factory()
+        driver.set_page_load_timeout(self.page_timeout)
+        with self._lock:
+            self._stats["created"] += 1
+            self._pages[id(driver)] = 0
+        return driver
+
+    def _discard(self, driver, reason: str):
+        with self._lock:
+            self._stats[reason] += 1
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Ошибка при закрытии браузера: {str(e)}")
+
+    @contextmanager
+    def checkout(self):
+        if self._closed:
+            raise RuntimeError("Пул браузеров закрыт")
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise TimeoutError("Нет свободного браузера в пуле")
+        with self._lock:
+            self._stats["checkout_wait_seconds"] += time.monotonic() - started
+        driver = None
+        try:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = self._new_driver()
+            yield driver
+        except TimeoutException:
+            # Таймаут страницы не ломает браузер — он возвращается в пул
+            with self._lock:
+                self._stats["page_timeouts"] += 1
+            if driver is not None:
+                self._checkin(driver)
+                driver = None
+            raise
+        except WebDriverException:
+            if driver is not None:
+                self._discard(driver, "crashed")
+                driver = None
+            raise
+        else:
+            self._checkin(driver)
+            driver = None
+        finally:
+            if driver is not None:
+                # Прочие исключения: состояние браузера неизвестно
+                self._discard(driver, "crashed")
+            self._slots.release()
+
+    def _checkin(self, driver):
+        with self._lock:
+            self._stats["pages_served"] += 1
+            self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+            exhausted = self._pages[id(driver)] >= self.max_pages
+        if exhausted or self._closed:
+            self._discard(driver, "recycled")
+        else:
+            self._idle.put(driver)
+
+    def fetch_page_source(self, url: str, wait_selector: str = ARTICLE_SELECTOR) -> str:
+        with self.checkout() as driver:
+            driver.get(url)
+            WebDriverWait(driver, self.wait_timeout).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, wait_selector))
+            )
+            return driver.page_source
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["alive"] = len(self._pages)
+        stats["idle"] = self._idle.qsize()
+        stats["in_use"] = stats["alive"] - stats["idle"]
+        stats["size"] = self.size
+        return stats
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver, "recycled")
+        logger.info(f"Пул браузеров закрыт: {self.stats()}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool()
+    return _pool
+
+
+def close_browser_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
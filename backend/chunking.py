@@ -0,0 +1,18 @@
+from llama_index.core.node_parser import SentenceSplitter
+
+# all-MiniLM-L6-v2 читает не больше 256 токенов: более длинный чанк модель обрезала бы,
+# и его хвост снова стал бы ненаходимым
+CHUNK_SIZE = 256
+CHUNK_OVERLAP = 32
+
+_splitter = SentenceSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+def split_article(content: str) -> list:
+    """Фрагменты статьи по предложениям; у статьи без текста — один пустой фрагмент."""
+    return _splitter.split_text(content or "") or [""]
+
+
+def chunk_embedding_text(title: str, chunk: str) -> str:
+    """Заголовок добавляется к каждому фрагменту, чтобы вектор знал, о чём статья."""
+    return f"{title}\n{chunk}"
@@ -1,16 +1,30 @@
 import sqlite3
 import json
 
+from sqlite_pool import AsyncConnectionPool
+from metrics import stage
+
+_pool = AsyncConnectionPool("rag_app.db")
+
+# История для LLM: ChatMemoryBuffer всё равно обрежет её до 2000 токенов
+MAX_HISTORY_TURNS = 10
+HISTORY_TOKEN_BUDGET = 2000
+# Грубая оценка длины без токенизатора
+CHARS_PER_TOKEN = 4
+
 
 def get_db_connection():
-    conn = sqlite3.connect("rag_app.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Соединение из пула на время блока: async with get_db_connection() as conn."""
+    return _pool.connection()
+
+
+async def close_db_pool():
+    await _pool.close()
 
 
-def create_application_logs():
-    with get_db_connection() as conn:
-        conn.execute(
+async def create_application_logs():
+    async with get_db_connection() as conn:
+        await conn.execute(
             """CREATE TABLE IF NOT EXISTS application_logs
                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
                         session_id TEXT,
@@ -21,53 +35,105 @@ def create_application_logs():
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"""
         )
         try:
-            conn.execute("SELECT gpt_response_sources FROM application_logs LIMIT 1")
+            await conn.execute("SELECT gpt_response_sources FROM application_logs LIMIT 1")
         except sqlite3.OperationalError:
-            conn.execute(
+            await conn.execute(
                 "ALTER TABLE application_logs ADD COLUMN gpt_response_sources TEXT"
             )
+        await conn.execute(
+            """CREATE INDEX IF NOT EXISTS idx_application_logs_session_created
+               ON application_logs (session_id, created_at)"""
+        )
+        await conn.commit()
 
 
-def insert_application_logs(
+async def insert_application_logs(
     session_id, user_query, gpt_response, gpt_response_sources, model
 ):
-    with get_db_connection() as conn:
-        sources_json = json.dumps(gpt_response_sources if gpt_response_sources else [])
-        conn.execute(
-            """INSERT INTO application_logs 
-                       (session_id, user_query, gpt_response, gpt_response_sources, model) 
-                       VALUES (?, ?, ?, ?, ?)""",
-            (session_id, user_query, gpt_response, sources_json, model),
-        )
+    with stage("history_save"):
+        async with get_db_connection() as conn:
+            sources_json = json.dumps(gpt_response_sources if gpt_response_sources else [])
+            await conn.execute(
+                """INSERT INTO application_logs
+                           (session_id, user_query, gpt_response, gpt_response_sources, model)
+                           VALUES (?, ?, ?, ?, ?)""",
+                (session_id, user_query, gpt_response, sources_json, model),
+            )
+            await conn.commit()
+
 
+def _decode_sources(raw):
+    if not raw:
+        return []
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        print(f"Error decoding sources JSON: {raw}")
+        return []
 
-def get_chat_history(session_id):
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT user_query, gpt_response, gpt_response_sources 
-                          FROM application_logs 
-                          WHERE session_id = ? ORDER BY created_at""",
-            (session_id,),
+
+async def get_chat_history(session_id, limit: int = 50, before_id: int = None):
+    """Страница истории сессии (keyset по (created_at, id)), от старых сообщений к новым.
+
+    Возвращает (history, next_before_id); next_before_id передаётся в
+    следующий запрос за более ранними сообщениями, None — страниц больше нет.
+    """
+    query = """SELECT id, user_query, gpt_response, gpt_response_sources
+               FROM application_logs WHERE session_id = ?"""
+    params = [session_id]
+    if before_id is not None:
+        query += """ AND (created_at, id) < (SELECT created_at, id FROM application_logs WHERE id = ?)"""
+        params.append(before_id)
+    query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    async with get_db_connection() as conn:
+        cursor = await conn.execute(query, params)
+        rows = await cursor.fetchall()
+
+    next_before_id = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_before_id = rows[-1]["id"]
+
+    history = []
+    for row in reversed(rows):
+        history.append({"role": "user", "content": row["user_query"]})
+        history.append(
+            {
+                "role": "ai",
+                "content": row["gpt_response"],
+                "sources": _decode_sources(row["gpt_response_sources"]),
+            }
         )
+    return history, next_before_id
 
-        history = []
-        rows = cursor.fetchall()
-        for row in rows:
-            history.append({"role": "user", "content": row["user_query"]})
-
-            llm_sources_list = []
-            if row["gpt_response_sources"]:
-                try:
-                    llm_sources_list = json.loads(row["gpt_response_sources"])
-                except json.JSONDecodeError:
-                    print(f"Error decoding sources JSON: {row['gpt_response_sources']}")
-
-            history.append(
-                {
-                    "role": "ai",
-                    "content": row["gpt_response"],
-                    "sources": llm_sources_list,
-                }
+
+async def get_recent_chat_history(
+    session_id, max_turns: int = MAX_HISTORY_TURNS, token_budget: int = HISTORY_TOKEN_BUDGET
+):
+    """Последние реплики сессии для LLM: не больше max_turns обменов и примерно token_budget токенов."""
+    with stage("history_load"):
+        async with get_db_connection() as conn:
+            cursor = await conn.execute(
+                """SELECT user_query, gpt_response FROM application_logs
+                   WHERE session_id = ? ORDER BY created_at DESC, id DESC LIMIT ?""",
+                (session_id, max_turns),
             )
-        return history
+            rows = await cursor.fetchall()
+
+    turns = []
+    used_tokens = 0
+    for row in rows:
+        user_query, gpt_response = row["user_query"] or "", row["gpt_response"] or ""
+        tokens = (len(user_query) + len(gpt_response)) // CHARS_PER_TOKEN
+        if turns and used_tokens + tokens > token_budget:
+            break
+        used_tokens += tokens
+        turns.append(row)
+
+    history = []
+    for row in reversed(turns):
+        history.append({"role": "user", "content": row["user_query"]})
+        history.append({"role": "ai", "content": row["gpt_response"]})
+    return history
@@ -0,0 +1,102 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+logger = logging.getLogger("embedding_service")
+
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_DIM = 384
+
+
+class EmbeddingService:
+    """Общий сервис эмбеддингов: одна модель на процесс и микро-батчинг.
+
+    Запросы от параллельных вызывающих собираются в одну очередь, и рабочий
+    поток объединяет их в один батч для модели (до max_batch_size текстов
+    или max_wait_ms ожидания после первого запроса).
+    """
+
+    def __init__(self, embed_model=None, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.model = embed_model or HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run, name="embedding-service", daemon=True
+        )
+        self._worker.start()
+
+    def embed(self, texts: list) -> np.ndarray:
+        """Возвращает нормализованные float32-эмбеддинги формы (len(texts), EMBED_DIM)."""
+        if not texts:
+            return np.empty((0, EMBED_DIM), dtype=np.float32)
+        future = Future()
+        self._queue.put((list(texts), future))
+        return future.result()
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = np.asarray(
+                    self.model.get_text_embedding_batch(texts), dtype=np.float32
+                )
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors /= np.where(norms == 0, 1, norms)
+            except Exception as e:
+                logger.error(f"Ошибка вычисления эмбеддингов: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            logger.debug(f"Батч эмбеддингов: {len(texts)} текстов от {len(batch)} запросов")
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def init_embedding_service(embed_model=None, **kwargs) -> EmbeddingService:
+    """Создаёт сервис эмбеддингов процесса (вызывается при старте приложения)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = EmbeddingService(embed_model, **kwargs)
+            logger.info(f"Сервис эмбеддингов инициализирован: {EMBED_MODEL_NAME}")
+        return _service
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Возвращает сервис эмбеддингов, создавая его при первом обращении."""
+    if _service is None:
+        return init_embedding_service()
+    return _service
@@ -0,0 +1,36 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("executors")
+
+# CPU-нагрузка (эмбеддинги, FAISS, SQLite news_database) — не больше, чем ядер
+CPU_EXECUTOR = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 4, thread_name_prefix="cpu"
+)
+# Блокирующие вызовы без async-аналога (Selenium)
+BLOCKING_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="blocking")
+
+
+async def _run_in(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Контекст копируется, чтобы contextvars запроса были видны в потоке
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(executor, call)
+
+
+async def run_cpu(func, *args, **kwargs):
+    return await _run_in(CPU_EXECUTOR, func, *args, **kwargs)
+
+
+async def run_blocking(func, *args, **kwargs):
+    return await _run_in(BLOCKING_EXECUTOR, func, *args, **kwargs)
+
+
+def shutdown_executors():
+    CPU_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    BLOCKING_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    logger.info("Пулы потоков остановлены")
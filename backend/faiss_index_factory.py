@@ -0,0 +1,189 @@
+import logging
+import math
+
+import faiss
+import numpy as np
+
+from embedding_service import EMBED_DIM
+
+logger = logging.getLogger("faiss_index_factory")
+
+INDEX_AUTO = "auto"
+INDEX_FLAT = "flat"
+INDEX_IVF_FLAT = "ivf_flat"
+INDEX_IVF_PQ = "ivf_pq"
+INDEX_HNSW = "hnsw"
+INDEX_SQ8 = "sq8"
+INDEX_TYPES = (INDEX_FLAT, INDEX_IVF_FLAT, INDEX_IVF_PQ, INDEX_HNSW, INDEX_SQ8)
+
+# Тип индекса: INDEX_AUTO выбирает его по размеру корпуса и бюджетам ниже
+INDEX_TYPE = INDEX_AUTO
+# Сколько памяти может занимать индекс
+MEMORY_BUDGET_MB = 512
+# Допустимая задержка одного поиска
+LATENCY_BUDGET_MS = 20.0
+# Грубая скорость полного перебора на одном ядре (векторов 384 float32 в миллисекунду)
+FLAT_SCAN_VECTORS_PER_MS = 5000
+# До стольких векторов точный поиск достаточно быстр при любом бюджете
+EXACT_SEARCH_MAX_VECTORS = 20000
+# k-means в FAISS нужно не меньше 39 обучающих точек на центроид
+MIN_POINTS_PER_CENTROID = 39
+# IVF переобучается, когда корпусу положено в RETRAIN_GROWTH раз больше списков, чем обучено
+RETRAIN_GROWTH = 2
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+# PQ кодирует каждые 8 измерений одним байтом: 48 байт на вектор вместо 1536
+PQ_DIMS_PER_CODE = 8
+PQ_CENTROIDS = 256
+
+
+def _nlist_for(ntotal: int) -> int:
+    return max(1, min(int(4 * math.sqrt(ntotal)), ntotal // MIN_POINTS_PER_CENTROID))
+
+
+def _nprobe_for(nlist: int) -> int:
+    return min(nlist, max(8, nlist // 16))
+
+
+def bytes_per_vector(index_type: str, dim: int = EMBED_DIM) -> int:
+    """Оценка памяти на один вектор вместе с его меткой (int64)."""
+    code_size = {
+        INDEX_FLAT: dim * 4,
+        INDEX_IVF_FLAT: dim * 4,
+        INDEX_HNSW: dim * 4 + HNSW_M * 2 * 4,
+        INDEX_SQ8: dim,
+        INDEX_IVF_PQ: dim // PQ_DIMS_PER_CODE,
+    }[index_type]
+    return code_size + 8
+
+
+def choose_index_spec(ntotal: int, index_type: str = None, memory_budget_mb: float = None,
+                      latency_budget_ms: float = None, dim: int = EMBED_DIM) -> dict:
+    """Тип и параметры индекса для корпуса из ntotal векторов.
+
+    Пока полный перебор укладывается в бюджет задержки, индекс точный
+    (Flat, а если не хватает памяти — SQ8). Дальше — IVF, у которого
+    векторы хранятся целиком, в SQ8 или в PQ, смотря что помещается в
+    бюджет памяти; если оценка задержки IVF всё равно выше бюджета, а
+    память позволяет, выбирается HNSW.
+    """
+    index_type = index_type or INDEX_TYPE
+    budget = (memory_budget_mb or MEMORY_BUDGET_MB) * 1024 * 1024
+    latency_budget_ms = latency_budget_ms or LATENCY_BUDGET_MS
+    ntotal = max(ntotal, 1)
+    nlist = _nlist_for(ntotal)
+    nprobe = _nprobe_for(nlist)
+
+    def fits(kind):
+        return ntotal * bytes_per_vector(kind, dim) <= budget
+
+    if index_type == INDEX_AUTO:
+        flat_ms = ntotal / FLAT_SCAN_VECTORS_PER_MS
+        ivf_ms = (nlist + ntotal * nprobe / nlist) / FLAT_SCAN_VECTORS_PER_MS
+        if ntotal <= EXACT_SEARCH_MAX_VECTORS or (flat_ms <= latency_budget_ms and fits(INDEX_FLAT)):
+            index_type = INDEX_FLAT if fits(INDEX_FLAT) else INDEX_SQ8
+        elif ivf_ms > latency_budget_ms and fits(INDEX_HNSW):
+            index_type = INDEX_HNSW
+        elif fits(INDEX_IVF_FLAT):
+            index_type = INDEX_IVF_FLAT
+        elif fits(INDEX_SQ8):
+            index_type = INDEX_SQ8
+        else:
+            index_type = INDEX_IVF_PQ
+    elif index_type not in INDEX_TYPES:
+        raise ValueError(f"Неизвестный тип индекса FAISS: {index_type}")
+
+    # Обучить PQ можно только на PQ_CENTROIDS * 39 точках; на меньшем корпусе берётся SQ8
+    if index_type == INDEX_IVF_PQ and ntotal < PQ_CENTROIDS * MIN_POINTS_PER_CENTROID:
+        index_type = INDEX_SQ8
+    # SQ8 на большом корпусе — с IVF, на маленьком — полный перебор сжатых векторов
+    ivf = index_type in (INDEX_IVF_FLAT, INDEX_IVF_PQ) or (
+        index_type == INDEX_SQ8 and ntotal > EXACT_SEARCH_MAX_VECTORS)
+    description = {
+        INDEX_FLAT: "IDMap2,Flat",
+        INDEX_IVF_FLAT: f"IVF{nlist},Flat",
+        INDEX_IVF_PQ: f"IVF{nlist},PQ{dim // PQ_DIMS_PER_CODE}x8",
+        INDEX_HNSW: f"IDMap2,HNSW{HNSW_M},Flat",
+        INDEX_SQ8: f"IVF{nlist},SQ8" if ivf else "IDMap2,SQ8",
+    }[index_type]
+    return {
+        "type": index_type,
+        "description": description,
+        "nlist": nlist if ivf else None,
+        "nprobe": nprobe if ivf else None,
+        "ef_search": HNSW_EF_SEARCH if index_type == INDEX_HNSW else None,
+    }
+
+
+def build_index(embeddings: np.ndarray, ids: np.ndarray, spec: dict):
+    """Создаёт индекс по spec, обучает его на embeddings (если нужно) и добавляет векторы с метками ids."""
+    dim = embeddings.shape[1] if embeddings.ndim == 2 else EMBED_DIM
+    index = faiss.index_factory(dim, spec["description"], faiss.METRIC_INNER_PRODUCT)
+    inner = _unwrap(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        inner.hnsw.efSearch = spec["ef_search"]
+    if not index.is_trained:
+        index.train(embeddings)
+    if isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = spec["nprobe"]
+    if len(ids):
+        index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+    return index
+
+
+def _unwrap(index):
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_spec_of(index) -> dict:
+    """Тип и параметры существующего индекса (в том числе прочитанного с диска)."""
+    inner = _unwrap(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return {"type": INDEX_HNSW, "nlist": None, "nprobe": None, "ef_search": inner.hnsw.efSearch}
+    if isinstance(inner, faiss.IndexIVF):
+        if isinstance(inner, faiss.IndexIVFPQ):
+            index_type = INDEX_IVF_PQ
+        elif isinstance(inner, faiss.IndexIVFScalarQuantizer):
+            index_type = INDEX_SQ8
+        else:
+            index_type = INDEX_IVF_FLAT
+        return {"type": index_type, "nlist": inner.nlist, "nprobe": inner.nprobe, "ef_search": None}
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return {"type": INDEX_SQ8, "nlist": None, "nprobe": None, "ef_search": None}
+    return {"type": INDEX_FLAT, "nlist": None, "nprobe": None, "ef_search": None}
+
+
+def needs_rebuild(index, spec: dict) -> bool:
+    """Нужно ли перестроить индекс: сменился подходящий тип или IVF пора переобучить на выросшем корпусе."""
+    current = index_spec_of(index)
+    if current["type"] != spec["type"] or (current["nlist"] is None) != (spec["nlist"] is None):
+        return True
+    return current["nlist"] is not None and spec["nlist"] >= current["nlist"] * RETRAIN_GROWTH
+
+
+def supports_remove(index) -> bool:
+    # HNSW не умеет удалять векторы: изменения в нём требуют перестройки
+    return not isinstance(_unwrap(index), faiss.IndexHNSW)
+
+
+def contained_ids(index, ids: np.ndarray) -> np.ndarray:
+    """Те из ids, что уже есть в индексе с IDMap (для индексов без remove_ids)."""
+    index = faiss.downcast_index(index)
+    if not isinstance(index, faiss.IndexIDMap) or not len(ids):
+        return np.empty(0, dtype=np.int64)
+    return ids[np.isin(ids, faiss.vector_to_array(index.id_map))]
+
+
+def search_parameters(index, nprobe: int = None, ef_search: int = None):
+    """Параметры одного поиска: nprobe для IVF, efSearch для HNSW; None — значения индекса."""
+    inner = _unwrap(index)
+    if nprobe and isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=min(int(nprobe), inner.nlist))
+    if ef_search and isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search))
+    return None
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+
+from faiss_index_factory import search_parameters
+
+logger = logging.getLogger("faiss_index_manager")
+
+INDEX_FILE = "faiss_index.bin"
+# Файл отображения позиций в id старого формата индекса (до меток по id записей БД)
+LEGACY_MAPPING_FILE = "faiss_to_db.json"
+# Пространство меток индекса: id фрагментов (news_chunks.id) или, до migrate_to_chunks, id статей (news.id)
+CHUNK_LABELS = "chunks"
+ARTICLE_LABELS = "news"
+
+
+class ReadWriteLock:
+    """Блокировка с множеством читателей и одним писателем (приоритет писателя)."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class FaissIndexManager:
+    """Держит индекс FAISS в памяти процесса вместе с пространством его меток.
+
+    Поиск выполняется под блокировкой чтения. Новая версия индекса
+    публикуется через publish(): файлы записываются на диск, затем
+    индекс подменяется атомарно. Изменения, сделанные другим процессом
+    (например, init_faiss.py), подхватываются по mtime файла индекса.
+    Пространство меток (CHUNK_LABELS или ARTICLE_LABELS) хранится в
+    файле рядом с индексом и привязано к его версии, поэтому индекс и
+    смысл его меток всегда меняются вместе.
+    """
+
+    def __init__(self, index_file: str = INDEX_FILE, check_interval: float = 2.0):
+        self.index_file = index_file
+        self.labels_file = f"{index_file}.labels"
+        self.check_interval = check_interval
+        self.update_lock = threading.Lock()
+        self._lock = ReadWriteLock()
+        self._index = None
+        self._labels = None
+        self._mtime = None
+        self._last_check = 0.0
+        self.load()
+
+    @property
+    def ntotal(self) -> int:
+        index = self._index
+        return index.ntotal if index is not None else 0
+
+    @property
+    def labels(self) -> str:
+        return self._labels
+
+    def load(self) -> bool:
+        """Читает индекс и его метки с диска; False, если файла нет, он старого формата или публикуется."""
+        if not os.path.exists(self.index_file):
+            return False
+        if os.path.exists(LEGACY_MAPPING_FILE):
+            # Индекс с позиционными метками: его перестроит initialize_faiss_index
+            logger.warning("Найден индекс FAISS старого формата, требуется перестройка")
+            return False
+        try:
+            with open(self.index_file, "rb") as f:
+                # mtime и содержимое берутся у одного открытого файла: os.replace при публикации его не подменит
+                stat = os.fstat(f.fileno())
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        labels = self._read_labels(stat)
+        if labels is None:
+            # Файл меток ещё от другой версии индекса: перечитаем, когда публикация закончится
+            logger.info("Метки индекса FAISS ещё не записаны, индекс будет перечитан позже")
+            return False
+        index = faiss.deserialize_index(np.frombuffer(data, dtype=np.uint8))
+        self._swap(index, labels, stat.st_mtime_ns)
+        logger.info(f"FAISS индекс загружен в память: {index.ntotal} векторов, метки — {labels}")
+        return True
+
+    def _read_labels(self, stat):
+        """Пространство меток версии индекса с данным stat; None — файл меток от другой версии."""
+        try:
+            with open(self.labels_file, encoding="utf-8") as f:
+                marker = json.load(f)
+        except FileNotFoundError:
+            # Индекс, опубликованный до появления файла меток, помечен id статей
+            return ARTICLE_LABELS
+        if (marker["mtime_ns"], marker["size"]) != (stat.st_mtime_ns, stat.st_size):
+            return None
+        return marker["labels"]
+
+    def _write_labels(self, labels: str, stat=None):
+        marker = {"labels": labels,
+                  "mtime_ns": stat.st_mtime_ns if stat else None,
+                  "size": stat.st_size if stat else None}
+        tmp_labels = f"{self.labels_file}.tmp"
+        with open(tmp_labels, "w", encoding="utf-8") as f:
+            json.dump(marker, f)
+        os.replace(tmp_labels, self.labels_file)
+
+    def reload_if_changed(self, force: bool = False):
+        """Перечитывает индекс, если файл изменился; без force — не чаще раза в check_interval."""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.stat(self.index_file).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            logger.info("Файл индекса FAISS изменён, перезагрузка")
+            self.load()
+
+    def snapshot(self):
+        """Текущий индекс; его нельзя менять на месте — только через publish()."""
+        return self.labelled_snapshot()[0]
+
+    def labelled_snapshot(self):
+        """(индекс, пространство меток) одной версии.
+
+        Вызывается под update_lock перед копированием индекса, поэтому файл,
+        опубликованный другим процессом, подхватывается сразу, без ожидания
+        check_interval: иначе publish() затёр бы его устаревшей копией.
+        """
+        self.reload_if_changed(force=True)
+        with self._lock.read():
+            return self._index, self._labels
+
+    def publish(self, index, labels: str = CHUNK_LABELS):
+        """Сохраняет новую версию индекса с её пространством меток и атомарно подменяет её в памяти.
+
+        Файл меток записывается после файла индекса и хранит его mtime и
+        размер: процесс, заставший публикацию посередине, не примет метки
+        одной версии для векторов другой, а перечитает индекс позже.
+        """
+        if not os.path.exists(self.labels_file):
+            # Без файла меток индекс читается как индекс по id статей — создаём его до подмены индекса
+            self._write_labels(labels)
+        tmp_index = f"{self.index_file}.tmp"
+        faiss.write_index(index, tmp_index)
+        os.replace(tmp_index, self.index_file)
+        stat = os.stat(self.index_file)
+        self._write_labels(labels, stat)
+        if os.path.exists(LEGACY_MAPPING_FILE):
+            os.remove(LEGACY_MAPPING_FILE)
+        self._swap(index, labels, stat.st_mtime_ns)
+
+    def search(self, query_embedding: np.ndarray, top_k: int, nprobe: int = None, ef_search: int = None):
+        """Возвращает (similarities, ids, labels) для одного запроса; -1 — нет соответствия.
+
+        labels — пространство меток той версии индекса, по которой шёл
+        поиск: CHUNK_LABELS (ids — news_chunks.id) или ARTICLE_LABELS
+        (ids — news.id). nprobe (IVF) и ef_search (HNSW) переопределяют
+        точность только для этого запроса, не меняя индекс, общий для всех
+        читателей.
+        """
+        self.reload_if_changed()
+        with self._lock.read():
+            index, labels = self._index, self._labels
+            if index is None or index.ntotal == 0:
+                return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64), labels
+            distances, ids = index.search(
+                query_embedding.reshape(1, -1), top_k, params=search_parameters(index, nprobe, ef_search)
+            )
+        return distances[0], ids[0], labels
+
+    def _swap(self, index, labels, mtime):
+        with self._lock.write():
+            self._index = index
+            self._labels = labels
+            self._mtime = mtime
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_index_manager() -> FaissIndexManager:
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = FaissIndexManager()
+    return _manager
+
+
+def reset_index_manager():
+    """Забывает загруженный индекс; следующий get_index_manager() прочитает его из текущего каталога."""
+    global _manager
+    with _manager_lock:
+        _manager = None
@@ -0,0 +1,61 @@
+import threading
+
+TIER_STATIC = "static"
+TIER_BROWSER = "browser"
+TIER_META = "meta"
+TIERS = (TIER_STATIC, TIER_BROWSER, TIER_META)
+
+
+class DomainTierPolicy:
+    """Запоминает по доменам, какой уровень загрузки статей срабатывает.
+
+    Статический уровень (HTTP GET + разбор HTML) пробуется первым, пока
+    его доля успехов на домене не опустится ниже min_static_rate после
+    min_attempts попыток. После этого домен сразу идёт в браузер, но
+    каждый probe_every-й запрос снова пробует статику, чтобы заметить,
+    что сайт снова отдаёт статьи в HTML.
+    """
+
+    def __init__(self, min_attempts: int = 5, min_static_rate: float = 0.3, probe_every: int = 20):
+        self.min_attempts = min_attempts
+        self.min_static_rate = min_static_rate
+        self.probe_every = probe_every
+        self._lock = threading.Lock()
+        self._domains = {}
+
+    def _domain(self, domain: str) -> dict:
+        stats = self._domains.get(domain)
+        if stats is None:
+            stats = self._domains[domain] = {
+                "requests": 0,
+                "skipped_static": 0,
+                **{f"{tier}_{outcome}": 0 for tier in TIERS for outcome in ("ok", "fail")},
+            }
+        return stats
+
+    def should_try_static(self, domain: str) -> bool:
+        with self._lock:
+            stats = self._domain(domain)
+            stats["requests"] += 1
+            attempts = stats["static_ok"] + stats["static_fail"]
+            if attempts < self.min_attempts or stats["requests"] % self.probe_every == 0:
+                return True
+            if stats["static_ok"] / attempts >= self.min_static_rate:
+                return True
+            stats["skipped_static"] += 1
+            return False
+
+    def record(self, domain: str, tier: str, success: bool):
+        with self._lock:
+            self._domain(domain)[f"{tier}_{'ok' if success else 'fail'}"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            domains = {domain: dict(stats) for domain, stats in self._domains.items()}
+        totals = {f"{tier}_{outcome}": 0 for tier in TIERS for outcome in ("ok", "fail")}
+        for stats in domains.values():
+            for key in totals:
+                totals[key] += stats[key]
+        served = sum(totals[f"{tier}_ok"] for tier in TIERS)
+        hit_rates = {tier: totals[f"{tier}_ok"] / served if served else 0.0 for tier in TIERS}
+        return {"totals": totals, "hit_rates": hit_rates, "domains": domains}
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger("http_client")
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+KEEPALIVE_EXPIRY = 60.0
+# Размер пула соединений по хостам: (max_connections, max_keepalive_connections)
+HOST_POOL_LIMITS = {
+    "*ria.ru": (8, 8),
+    "*newsapi.org": (4, 4),
+}
+DEFAULT_POOL_LIMITS = (20, 10)
+
+
+class PooledHttpClient:
+    """Общий для модуля pars HTTP-клиент с пулами соединений по хостам.
+
+    Соединения (TCP/TLS) переиспользуются между запросами; политика
+    повторов одна на все запросы: retries попыток с экспоненциальной
+    задержкой при ошибках соединения и статусах из RETRY_STATUSES.
+    Новые соединения считаются через публичное расширение trace httpx,
+    без обращения к внутренностям пулов httpcore.
+    """
+
+    def __init__(self, host_limits: dict = HOST_POOL_LIMITS, default_limits: tuple = DEFAULT_POOL_LIMITS,
+                 retries: int = 3, backoff_factor: float = 1, timeout: float = 15):
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.limits = {**host_limits, "default": default_limits}
+        self._transports = {
+            pattern: httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                )
+            )
+            for pattern, (max_connections, max_keepalive) in host_limits.items()
+        }
+        max_connections, max_keepalive = default_limits
+        self._client = httpx.AsyncClient(
+            headers=HEADERS,
+            follow_redirects=True,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            mounts={f"all://{pattern}": transport for pattern, transport in self._transports.items()},
+            event_hooks={"request": [self._trace_connections]},
+        )
+        self._stats = defaultdict(
+            lambda: {"requests": 0, "retries": 0, "errors": 0, "in_flight": 0, "connections_opened": 0}
+        )
+
+    async def _trace_connections(self, request: httpx.Request):
+        stats = self._stats[request.url.host]
+
+        async def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                stats["connections_opened"] += 1
+
+        request.extensions["trace"] = trace
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        stats = self._stats[urlsplit(url).hostname or ""]
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await self._client.get(url, **kwargs)
+                    if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                        return response
+                except httpx.TransportError:
+                    if attempt == self.retries:
+                        stats["errors"] += 1
+                        raise
+                stats["retries"] += 1
+                await asyncio.sleep(self.backoff_factor * (2**attempt))
+        finally:
+            stats["in_flight"] -= 1
+
+    def stats(self) -> dict:
+        hosts = {}
+        for host, stats in self._stats.items():
+            stats = dict(stats)
+            attempts = stats["requests"] + stats["retries"]
+            # Доля попыток, ушедших по уже открытому соединению
+            stats["connection_reuse_ratio"] = 1 - stats["connections_opened"] / attempts if attempts else 0.0
+            hosts[host] = stats
+        pools = {pattern: {"max_connections": max_connections, "max_keepalive_connections": max_keepalive}
+                 for pattern, (max_connections, max_keepalive) in self.limits.items()}
+        return {"hosts": hosts, "pools": pools}
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+_client = None
+
+
+def get_http_client() -> PooledHttpClient:
+    global _client
+    if _client is None:
+        _client = PooledHttpClient()
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        logger.info(f"HTTP-клиент закрыт: {client.stats()}")
+        await client.aclose()
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger("ingest_queue")
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class IngestJobQueue:
+    """Внутрипроцессная очередь фоновой загрузки новостей.
+
+    Задание — это (kind, query, limit); handlers[kind] — корутина,
+    которая скачивает и сохраняет статьи и возвращает (results, meta),
+    как search_ria_simple. Одинаковое задание, которое ещё ждёт или
+    выполняется, не ставится повторно: возвращается существующее.
+    Одновременно выполняется не больше workers заданий, в очереди ждёт
+    не больше max_pending. Завершённые задания хранятся keep_finished
+    секунд (но не больше max_finished) для запросов статуса.
+    """
+
+    def __init__(self, handlers: dict, workers: int = 2, max_pending: int = 100,
+                 keep_finished: float = 3600, max_finished: int = 1000):
+        self.handlers = handlers
+        self.workers = workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._active = {}
+        # asyncio.Queue привязывается к event loop при первом ожидании, а не при создании:
+        # задания, поставленные до start(), выполнятся после запуска обработчиков
+        self._queue = asyncio.Queue()
+        self._tasks = []
+        self._stats = {"submitted": 0, "deduplicated": 0, "rejected": 0, "done": 0, "failed": 0}
+
+    async def start(self):
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"ingest-worker-{i}") for i in range(self.workers)
+        ]
+        logger.info(f"Очередь загрузки запущена: {self.workers} обработчиков")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @staticmethod
+    def _key(kind: str, query: str, limit: int) -> tuple:
+        return kind, " ".join(query.lower().split()), limit
+
+    def submit(self, kind: str, query: str, limit: int) -> dict:
+        """Ставит задание в очередь или возвращает такое же незавершённое."""
+        if kind not in self.handlers:
+            raise ValueError(f"Неизвестный тип задания: {kind}")
+        key = self._key(kind, query, limit)
+        job_id = self._active.get(key)
+        if job_id is not None:
+            self._stats["deduplicated"] += 1
+            return dict(self._jobs[job_id])
+        if self._queue.qsize() >= self.max_pending:
+            self._stats["rejected"] += 1
+            raise QueueFullError(f"В очереди уже {self.max_pending} заданий")
+
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "kind": kind,
+            "query": query,
+            "limit": limit,
+            "status": JOB_QUEUED,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        self._prune()
+        self._jobs[job["job_id"]] = job
+        self._active[key] = job["job_id"]
+        self._queue.put_nowait(job["job_id"])
+        self._stats["submitted"] += 1
+        return dict(job)
+
+    def get(self, job_id: str) -> dict:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def wait(self, job_id: str, timeout: float = None) -> dict:
+        """Ждёт завершения задания (для клиентов, которым нужен синхронный ответ)."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in (JOB_DONE, JOB_FAILED):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(0.1)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            job["status"] = JOB_RUNNING
+            job["started_at"] = time.time()
+            try:
+                results, meta = await self.handlers[job["kind"]](job["query"], job["limit"])
+                if meta.get("status") == "error":
+                    raise RuntimeError(meta.get("message", "ошибка загрузки"))
+                job["result"] = {
+                    **meta,
+                    "results": [
+                        {"title": doc.metadata.get("title"), "url": doc.metadata.get("url")}
+                        for doc in results
+                    ],
+                }
+                job["status"] = JOB_DONE
+                self._stats["done"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Задание {job_id} ({job['kind']}: {job['query']}) завершилось ошибкой: {str(e)}")
+                job["error"] = str(e)
+                job["status"] = JOB_FAILED
+                self._stats["failed"] += 1
+            finally:
+                job["finished_at"] = time.time()
+                self._active.pop(self._key(job["kind"], job["query"], job["limit"]), None)
+
+    def _prune(self):
+        now = time.time()
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None
+        ]
+        expired = {job_id for job_id in finished if now - self._jobs[job_id]["finished_at"] > self.keep_finished}
+        remaining = [job_id for job_id in finished if job_id not in expired]
+        # Сверх max_finished удаляются самые старые из оставшихся
+        expired.update(remaining[:max(0, len(remaining) - self.max_finished)])
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict:
+        statuses = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED)}
+        for job in self._jobs.values():
+            statuses[job["status"]] += 1
+        return {**self._stats, "workers": self.workers, "jobs": statuses}
@@ -1,7 +1,16 @@
-from news_db_utils import rebuild_embeddings, initialize_faiss_index
+import argparse
+import logging
 
-# Перестроить эмбеддинги с учётом title
-rebuild_embeddings()
+from news_db_utils import migrate_to_chunks
 
-# Перестроить индекс FAISS
-initialize_faiss_index(force=True)
\ No newline at end of file
+parser = argparse.ArgumentParser(description="Перестройка эмбеддингов и индекса FAISS")
+parser.add_argument("--batch-size", type=int, default=64, help="Размер батча для модели эмбеддингов")
+parser.add_argument("--commit-every", type=int, default=1000, help="Фиксировать изменения каждые N строк")
+parser.add_argument("--restart", action="store_true", help="Начать заново, игнорируя контрольную точку")
+args = parser.parse_args()
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Разбить статьи на фрагменты, перестроить их эмбеддинги (с продолжением после сбоя) и индекс FAISS.
+# Работающий сервер тем временем ищет по прежнему индексу и переключится на новый по mtime файла
+migrate_to_chunks(batch_size=args.batch_size, commit_every=args.commit_every, resume=not args.restart)
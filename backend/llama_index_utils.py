@@ -1,72 +1,186 @@
-from llama_index.core import Settings, VectorStoreIndex, Document
+from llama_index.core import Settings, QueryBundle
+from llama_index.core.chat_engine import ContextChatEngine
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, TextNode
 from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.core.memory import ChatMemoryBuffer
 from llama_index.core.chat_engine.types import ChatMessage
 import logging
-from news_db_utils import fetch_news_from_db
+import os
+from news_db_utils import fetch_news_from_db, fetch_news_lexical
+from news_fts import is_keyword_query
+from embedding_service import init_embedding_service, get_embedding_service
+from answer_cache import get_answer_cache
+from executors import run_cpu
+from chunking import CHUNK_SIZE, CHUNK_OVERLAP
+from metrics import stage
 
 logger = logging.getLogger("llama_index_utils")
 
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+
 def setup_settings():
-    Settings.llm = Ollama(model="llama3.2:3b", request_timeout=60.0)
-    Settings.embed_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    Settings.chunk_size = 512
-    Settings.chunk_overlap = 50
+    Settings.llm = Ollama(model="llama3.2:3b", base_url=OLLAMA_BASE_URL, request_timeout=60.0)
+    # Одна модель эмбеддингов на процесс: её же использует сервис для поиска и загрузки
+    Settings.embed_model = init_embedding_service().model
+    Settings.chunk_size = CHUNK_SIZE
+    Settings.chunk_overlap = CHUNK_OVERLAP
     logger.info("Настройки LLM и эмбеддингов инициализированы")
 
-def process_news_with_llm(query: str, chat_history: list = None) -> str:
-    try:
-        news_results = fetch_news_from_db(query)
+class NewsStoreRetriever(BaseRetriever):
+    """Ретривер поверх постоянного хранилища FAISS/SQLite.
+
+    Документы не переэмбеддятся: на запрос считается один эмбеддинг,
+    выдача — гибрид FAISS по фрагментам и BM25, текст узла — лучшие
+    фрагменты статьи, а оценка узла — косинусное сходство с лучшим из них. Короткие запросы из ключевых слов ищутся только по BM25, без
+    эмбеддинга (query_embedding тогда None, и кэш ответов не используется).
+    Результат последнего запроса запоминается, чтобы проверка перед чатом
+    и сам чат-движок не искали дважды.
+    """
+
+    def __init__(self, similarity_top_k: int = 2, **kwargs):
+        super().__init__(**kwargs)
+        self.similarity_top_k = similarity_top_k
+        self._last_query = None
+        self._last_nodes = []
+        self.query_embedding = None
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list:
+        if query_bundle.query_str == self._last_query:
+            return self._last_nodes
+        news_results = []
+        self.query_embedding = None
+        if is_keyword_query(query_bundle.query_str):
+            news_results = fetch_news_lexical(query_bundle.query_str, top_k=self.similarity_top_k)
         if not news_results:
-            logger.warning(f"Новости для запроса '{query}' не найдены")
-            return f"Не удалось найти новости по запросу '{query}'. Попробуйте изменить запрос."
-        docs = [
-            Document(
-                text=news["content"][:1000] + "..." if len(news["content"]) > 1000 else news["content"],
-                metadata={"source_url": news["url"], "title": news["title"]}
-            ) for news in news_results
+            # Эмбеддинг запроса сохраняется для семантического кэша ответов
+            with stage("embed_query"):
+                self.query_embedding = get_embedding_service().embed_one(query_bundle.query_str)
+            news_results = fetch_news_from_db(
+                query_bundle.query_str, top_k=self.similarity_top_k, query_embedding=self.query_embedding
+            )
+        nodes = []
+        for news in news_results:
+            node = TextNode(
+                id_=str(news["id"]),
+                text=news["content"],
+                metadata={"source_url": news["url"], "title": news["title"]},
+            )
+            score = news["similarity"] if news["similarity"] is not None else news["score"]
+            nodes.append(NodeWithScore(node=node, score=score))
+        self._last_query, self._last_nodes = query_bundle.query_str, nodes
+        return nodes
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> list:
+        # Эмбеддинг запроса, FAISS и SQLite — в отдельном пуле, event loop не блокируется
+        return await run_cpu(self._retrieve, query_bundle)
+
+
+SYSTEM_PROMPT = (
+    "Отвечай на русском. Используй предоставленный контекст и историю чата. "
+    "На основе предоставленных новостей ответь на вопрос пользователя. "
+    "Указывай источники в формате: [Источник: <URL>]."
+)
+
+
+def build_chat_engine(retriever: BaseRetriever, chat_history: list = None) -> ContextChatEngine:
+    memory = ChatMemoryBuffer.from_defaults(token_limit=2000)
+    if chat_history:
+        formatted_history = [
+            ChatMessage(role="user" if msg["role"] in ("user", "human") else "assistant", content=msg["content"])
+            for msg in chat_history
         ]
-        index = VectorStoreIndex.from_documents(docs, embed_model=Settings.embed_model)
-        memory = ChatMemoryBuffer.from_defaults(token_limit=2000)
-        if chat_history:
-            formatted_history = [
-                ChatMessage(role="user" if msg["role"] == "human" else "assistant", content=msg["content"])
-                for msg in chat_history
-            ]
-            memory.set(formatted_history)
-            logger.info(f"Установлена история чата: {len(formatted_history)} сообщений")
-        chat_engine = index.as_chat_engine(
-            chat_mode="context",
-            memory=memory,
-            system_prompt=(
-                "Отвечай на русском. Используй предоставленный контекст и историю чата. "
-                "Указывай источники в формате: [Источник: <URL>]."
-            ),
-            similarity_top_k=2,
-            verbose=True
-        )
-        llm_query = f"На основе предоставленных новостей ответь на вопрос: {query}"
-        response = chat_engine.chat(llm_query)
-        used_nodes = response.source_nodes
-        used_urls = {node.metadata.get("source_url") for node in used_nodes if node.metadata.get("source_url")}
-        logger.debug(f"Использованные источники: {used_urls}")
-        
-        logger.info("Ответ от LLM успешно получен")
+        memory.set(formatted_history)
+        logger.info(f"Установлена история чата: {len(formatted_history)} сообщений")
+    return ContextChatEngine.from_defaults(
+        retriever=retriever,
+        memory=memory,
+        system_prompt=SYSTEM_PROMPT,
+    )
+
+
+def get_source_urls(source_nodes) -> list:
+    used_urls = set()
+    for node in source_nodes or []:
+        source_url = node.metadata.get("source_url")
+        if source_url:  # Добавляем только если URL не пустой
+            used_urls.add(source_url)
+    logger.info(f"Использованные URL из source_nodes: {used_urls}")
+    return list(used_urls)
+
+
+def cache_lookup(retriever: NewsStoreRetriever, nodes: list, chat_history: list) -> dict:
+    """Ответ из кэша; кэш используется только без истории чата, от которой зависит ответ."""
+    if chat_history or retriever.query_embedding is None:
+        return None
+    return get_answer_cache().get(retriever.query_embedding, [node.node.id_ for node in nodes])
+
 
-        used_urls = set()
-        if response.source_nodes:
-            for node in response.source_nodes:
-                source_url = node.metadata.get("source_url")
-                if source_url:  # Добавляем только если URL не пустой
-                    used_urls.add(source_url)
-        logger.info(f"Использованные URL из source_nodes: {used_urls}")
+def cache_store(retriever: NewsStoreRetriever, nodes: list, chat_history: list, answer: dict):
+    if chat_history or retriever.query_embedding is None:
+        return
+    # Если найдено меньше top_k статей, любая новая статья меняет выдачу
+    min_similarity = (
+        min(node.score for node in nodes) if len(nodes) >= retriever.similarity_top_k else -1.0
+    )
+    get_answer_cache().put(
+        retriever.query_embedding, [node.node.id_ for node in nodes], answer, min_similarity
+    )
 
-        final_answer = response.response
+
+async def process_news_with_llm(query: str, chat_history: list = None) -> str:
+    try:
+        retriever = NewsStoreRetriever(similarity_top_k=2)
+        with stage("retrieve"):
+            nodes = await retriever.aretrieve(query)
+        if not nodes:
+            logger.warning(f"Новости для запроса '{query}' не найдены")
+            return f"Не удалось найти новости по запросу '{query}'. Попробуйте изменить запрос."
+        cached = cache_lookup(retriever, nodes, chat_history)
+        if cached:
+            logger.info("Ответ взят из семантического кэша")
+            return cached
+        chat_engine = build_chat_engine(retriever, chat_history)
+        # Поиск выполняется по самому вопросу; инструкция перенесена в system_prompt,
+        # чтобы ретривер переиспользовал результат проверки выше
+        with stage("llm_generate"):
+            response = await chat_engine.achat(query)
+        used_urls = get_source_urls(response.source_nodes)
 
         logger.info("Ответ от LLM успешно получен")
-        return {"answer": final_answer, "sources": list(used_urls)}
+        result = {"answer": response.response, "sources": used_urls}
+        cache_store(retriever, nodes, chat_history, result)
+        return result
     
     except Exception as e:
         logger.error(f"Ошибка LLM: {str(e)}")
-        return f"Ошибка при обработке запроса: {str(e)}"
\ No newline at end of file
+        return f"Ошибка при обработке запроса: {str(e)}"
+
+
+async def stream_news_with_llm(query: str, chat_history: list = None):
+    """Генератор событий ответа: ("token", str) по мере генерации, в конце ("sources", list)."""
+    retriever = NewsStoreRetriever(similarity_top_k=2)
+    with stage("retrieve"):
+        nodes = await retriever.aretrieve(query)
+    if not nodes:
+        logger.warning(f"Новости для запроса '{query}' не найдены")
+        yield "token", f"Не удалось найти новости по запросу '{query}'. Попробуйте изменить запрос."
+        yield "sources", []
+        return
+    cached = cache_lookup(retriever, nodes, chat_history)
+    if cached:
+        logger.info("Ответ взят из семантического кэша")
+        yield "token", cached["answer"]
+        yield "sources", cached["sources"]
+        return
+    chat_engine = build_chat_engine(retriever, chat_history)
+    answer_parts = []
+    with stage("llm_generate"):
+        response = await chat_engine.astream_chat(query)
+        async for token in response.async_response_gen():
+            answer_parts.append(token)
+            yield "token", token
+    logger.info("Потоковый ответ от LLM успешно получен")
+    sources = get_source_urls(response.source_nodes)
+    cache_store(retriever, nodes, chat_history, {"answer": "".join(answer_parts), "sources": sources})
+    yield "sources", sources
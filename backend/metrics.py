@@ -0,0 +1,185 @@
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("metrics")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Заголовок Server-Timing с этапами запроса добавляется при SERVER_TIMING=1
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING", "0") == "1"
+# Границы корзин гистограмм, секунды: от быстрых этапов (FAISS) до генерации LLM
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value) -> str:
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value) if not value.is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            return [(dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+    def render(self) -> list:
+        return _render_family(self.name, "counter", self.documentation, self.samples())
+
+
+class Histogram:
+    """Гистограмма Prometheus с фиксированными корзинами и метками."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            series = {key: {**value, "counts": list(value["counts"])} for key, value in self._series.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, value in series.items():
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, value["counts"]):
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {value['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {value['count']}")
+        return lines
+
+
+def _render_family(name: str, metric_type: str, documentation: str, samples) -> list:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+    return lines
+
+
+class MetricsRegistry:
+    """Метрики процесса в текстовом формате Prometheus.
+
+    Счётчики и гистограммы обновляются по ходу работы. Коллекторы —
+    функции, которые при каждом опросе /metrics возвращают семейства
+    (name, type, documentation, [(labels, value)]) из уже существующей
+    статистики (кэши, очередь, индекс), чтобы не вести её дважды.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрик {getattr(collector, '__name__', collector)}: {str(e)}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.extend(_render_family(name, metric_type, documentation, samples))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_duration_seconds", "Длительность этапов обработки (эмбеддинг, FAISS, SQLite, LLM, загрузка)",
+    ("stage",),
+)
+STAGE_ERRORS = REGISTRY.counter("rag_stage_errors_total", "Этапы, завершившиеся исключением", ("stage",))
+HTTP_SECONDS = REGISTRY.histogram(
+    "rag_http_request_duration_seconds", "Длительность HTTP-запросов к API", ("method", "path", "status"),
+)
+
+# Этапы текущего запроса для Server-Timing; executors копируют контекст в потоки пулов
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Замеряет блок как этап name: гистограмма и, внутри HTTP-запроса, Server-Timing."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def start_request_timings() -> list:
+    """Начинает сбор этапов для текущего запроса (вызывается из middleware)."""
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: list) -> str:
+    """Server-Timing: повторяющиеся этапы суммируются, длительность в миллисекундах."""
+    totals = {}
+    for name, elapsed in timings:
+        totals[name] = totals.get(name, 0.0) + elapsed
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in totals.items())
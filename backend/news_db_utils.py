@@ -1,17 +1,43 @@
 import sqlite3
 import logging
+import hashlib
 import numpy as np
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 import pickle
 import faiss
-import os
+import time
+from embedding_service import get_embedding_service, EMBED_DIM
+from faiss_index_manager import get_index_manager, CHUNK_LABELS, ARTICLE_LABELS
+from faiss_index_factory import (
+    choose_index_spec, build_index, needs_rebuild, supports_remove, contained_ids,
+)
+from answer_cache import get_answer_cache
+from sqlite_pool import ThreadLocalConnectionPool
+from news_fts import create_fts_index, is_keyword_query, search_fts, reciprocal_rank_fusion, lexical_overlap
+from chunking import split_article, chunk_embedding_text
+from metrics import stage
 
 logger = logging.getLogger("news_db_utils")
 
+# Эмбеддинги хранятся как сырые float32 фиксированной длины (EMBED_DIM * 4 байт)
+EMBEDDING_BYTES = EMBED_DIM * 4
+FLOAT32_EMBEDDINGS_VERSION = 1
+CONTENT_HASH_VERSION = 2
+CHUNKS_VERSION = 3
+# Сколько лучших фрагментов статьи попадает в выдачу
+MAX_CHUNKS_PER_ARTICLE = 2
+# Сколько кандидатов на каждую позицию выдачи берут FAISS и BM25 перед слиянием
+HYBRID_CANDIDATES_FACTOR = 4
+# Статьи, загруженные позже этого окна, не скачиваются и не эмбеддятся повторно
+FRESHNESS_WINDOW_SECONDS = 6 * 3600
+
+_pool = ThreadLocalConnectionPool("news_database.db")
+
 def get_db_connection():
-    conn = sqlite3.connect("news_database.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Соединение текущего потока; "with get_db_connection() as conn" — это транзакция, не закрытие."""
+    return _pool.connection()
+
+def close_db_connections():
+    _pool.close()
 
 def initialize_database():
     with get_db_connection() as conn:
@@ -20,10 +46,34 @@ def initialize_database():
                         title TEXT NOT NULL,
                         content TEXT,
                         url TEXT UNIQUE,
-                        embedding BLOB)''')
+                        embedding BLOB,
+                        fetched_at TIMESTAMP,
+                        content_hash TEXT)''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_news_title ON news(title)')
+        create_chunks_table(conn)
         conn.commit()
+    update_database_schema()
+    with get_db_connection() as conn:
+        create_fts_index(conn)
+    migrate_embeddings_to_float32()
+    backfill_content_hashes()
+    if check_chunks_migration():
+        # Индекса фрагментов ещё нет: до migrate_to_chunks поиск идёт по векторам целых статей
+        if get_index_manager().ntotal == 0:
+            initialize_article_index()
+        return
     initialize_faiss_index()
 
+def create_chunks_table(conn):
+    """Фрагменты статей: по одному вектору на фрагмент, метки FAISS — news_chunks.id."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS news_chunks
+                   (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    news_id INTEGER NOT NULL REFERENCES news(id),
+                    chunk_index INTEGER NOT NULL,
+                    text TEXT,
+                    embedding BLOB)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_news_chunks_news_id ON news_chunks(news_id, chunk_index)')
+
 def update_database_schema():
     with get_db_connection() as conn:
         try:
@@ -31,226 +81,598 @@ def update_database_schema():
             logger.info("Столбец 'embedding' добавлен в таблицу 'news'")
         except sqlite3.OperationalError:
             logger.info("Столбец 'embedding' уже существует")
+        try:
+            conn.execute("ALTER TABLE news ADD COLUMN fetched_at TIMESTAMP")
+            logger.info("Столбец 'fetched_at' добавлен в таблицу 'news'")
+        except sqlite3.OperationalError:
+            logger.info("Столбец 'fetched_at' уже существует")
+        try:
+            conn.execute("ALTER TABLE news ADD COLUMN content_hash TEXT")
+            logger.info("Столбец 'content_hash' добавлен в таблицу 'news'")
+        except sqlite3.OperationalError:
+            logger.info("Столбец 'content_hash' уже существует")
         conn.commit()
 
-def rebuild_embeddings():
-    """Перестраивает эмбеддинги для всех новостей, включая title."""
-    embed_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+def encode_embedding(embedding) -> bytes:
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+def embedding_text(title, content) -> str:
+    """Текст, по которому считается эмбеддинг статьи."""
+    return f"{title}\n{content or ''}"
+
+def content_hash(title, content) -> str:
+    """SHA-256 от title+content: совпадение означает, что эмбеддинг пересчитывать не нужно."""
+    return hashlib.sha256(embedding_text(title, content).encode("utf-8")).hexdigest()
+
+def decode_embeddings(blobs) -> np.ndarray:
+    """Собирает BLOB'ы float32 в матрицу (n, EMBED_DIM) через np.frombuffer."""
+    if not blobs:
+        return np.empty((0, EMBED_DIM), dtype=np.float32)
+    return np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(-1, EMBED_DIM)
+
+def migrate_embeddings_to_float32(batch_size: int = 1000):
+    """Однократно переводит pickle(float64) эмбеддинги в сырые float32 BLOB'ы."""
+    with get_db_connection() as conn:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= FLOAT32_EMBEDDINGS_VERSION:
+            return
+        migrated = 0
+        last_id = 0
+        while True:
+            rows = conn.execute('''SELECT id, embedding FROM news
+                                   WHERE id > ? AND embedding IS NOT NULL AND length(embedding) != ?
+                                   ORDER BY id LIMIT ?''',
+                                (last_id, EMBEDDING_BYTES, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            updates = []
+            for row in rows:
+                try:
+                    embedding = pickle.loads(row['embedding'])
+                    updates.append((encode_embedding(embedding), row['id']))
+                except Exception as e:
+                    logger.error(f"Не удалось прочитать эмбеддинг id={row['id']}: {str(e)}")
+                    updates.append((None, row['id']))
+            conn.executemany('UPDATE news SET embedding = ? WHERE id = ?', updates)
+            migrated += len(updates)
+        conn.execute(f'PRAGMA user_version = {FLOAT32_EMBEDDINGS_VERSION}')
+        conn.commit()
+    if migrated:
+        logger.info(f"Эмбеддинги переведены в формат float32: {migrated} записей")
+
+def backfill_content_hashes(batch_size: int = 1000):
+    """Однократно заполняет content_hash для записей, сохранённых до его появления."""
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, title, content FROM news')
-        rows = cursor.fetchall()
-        
-        for row in rows:
-            print (row['title'])
-            id, title, content = row['id'], row['title'], row['content']
-            # Комбинируем title и content
-            text = f"{title}\n{content or ''}"
-            embedding = embed_model.get_text_embedding(text)
-            embedding_bytes = pickle.dumps(np.array(embedding))
-            cursor.execute('UPDATE news SET embedding = ? WHERE id = ?', (embedding_bytes, id))
-        
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= CONTENT_HASH_VERSION:
+            return
+        filled = 0
+        last_id = 0
+        while True:
+            rows = conn.execute('''SELECT id, title, content FROM news
+                                   WHERE id > ? AND content_hash IS NULL
+                                   ORDER BY id LIMIT ?''',
+                                (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            conn.executemany('UPDATE news SET content_hash = ? WHERE id = ?',
+                             [(content_hash(row['title'], row['content']), row['id']) for row in rows])
+            filled += len(rows)
+        conn.execute(f'PRAGMA user_version = {CONTENT_HASH_VERSION}')
         conn.commit()
-        logger.info(f"Перестроены эмбеддинги для {len(rows)} новостей")
+    if filled:
+        logger.info(f"Заполнен content_hash для {filled} записей")
+
+def _load_rebuild_checkpoint(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS embedding_rebuild_checkpoint
+                   (id INTEGER PRIMARY KEY CHECK (id = 1),
+                    last_id INTEGER NOT NULL,
+                    processed INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    row = conn.execute('SELECT last_id, processed FROM embedding_rebuild_checkpoint WHERE id = 1').fetchone()
+    return (row['last_id'], row['processed']) if row else (0, 0)
+
+def _save_rebuild_checkpoint(conn, last_id, processed):
+    conn.execute('''INSERT INTO embedding_rebuild_checkpoint (id, last_id, processed, updated_at)
+                   VALUES (1, ?, ?, CURRENT_TIMESTAMP)
+                   ON CONFLICT(id) DO UPDATE SET last_id = excluded.last_id,
+                       processed = excluded.processed, updated_at = excluded.updated_at''',
+                 (last_id, processed))
+
+def chunk_articles(articles):
+    """Режет статьи [(title, content)] на фрагменты и считает их эмбеддинги одним вызовом.
+
+    Возвращает (chunks, vectors): chunks[i] — список текстов фрагментов
+    i-й статьи, vectors — эмбеддинги всех фрагментов подряд.
+    """
+    chunks = [split_article(content) for _, content in articles]
+    texts = [chunk_embedding_text(title, chunk)
+             for (title, _), article_chunks in zip(articles, chunks) for chunk in article_chunks]
+    return chunks, get_embedding_service().embed(texts)
+
+def replace_chunks(conn, news_ids, chunks, vectors):
+    """Заменяет фрагменты статей news_ids; возвращает (id новых фрагментов, id удалённых)."""
+    removed_ids = [row['id'] for row in _select_in(
+        conn, 'SELECT id FROM news_chunks WHERE news_id IN ({placeholders})', news_ids)]
+    conn.executemany('DELETE FROM news_chunks WHERE news_id = ?', [(news_id,) for news_id in news_ids])
+    rows = [(news_id, chunk_index, text)
+            for news_id, article_chunks in zip(news_ids, chunks)
+            for chunk_index, text in enumerate(article_chunks)]
+    conn.executemany('INSERT INTO news_chunks (news_id, chunk_index, text, embedding) VALUES (?, ?, ?, ?)',
+                     [(news_id, chunk_index, text, encode_embedding(vector))
+                      for (news_id, chunk_index, text), vector in zip(rows, vectors)])
+    chunk_ids = {(row['news_id'], row['chunk_index']): row['id'] for row in _select_in(
+        conn, 'SELECT id, news_id, chunk_index FROM news_chunks WHERE news_id IN ({placeholders})', news_ids)}
+    return [chunk_ids[(news_id, chunk_index)] for news_id, chunk_index, _ in rows], removed_ids
+
+def rebuild_embeddings(batch_size: int = 64, commit_every: int = 1000, resume: bool = True):
+    """Заново режет все новости на фрагменты и перестраивает их эмбеддинги.
+
+    Строки читаются страницами по id, эмбеддинги считаются батчами по
+    batch_size статей, а каждые commit_every строк изменения фиксируются
+    вместе с контрольной точкой. При resume=True прерванная перестройка
+    продолжается с последней контрольной точки.
+    """
+    with get_db_connection() as conn:
+        create_chunks_table(conn)
+        last_id, processed = _load_rebuild_checkpoint(conn)
+        if not resume or not last_id:
+            last_id, processed = 0, 0
+            _save_rebuild_checkpoint(conn, last_id, processed)
+            conn.commit()
+        else:
+            logger.info(f"Продолжение перестройки эмбеддингов с id > {last_id} ({processed} уже обработано)")
+
+        started = time.monotonic()
+        done_in_run = 0
+        while True:
+            rows = conn.execute('SELECT id, title, content FROM news WHERE id > ? ORDER BY id LIMIT ?',
+                                (last_id, commit_every)).fetchall()
+            if not rows:
+                break
+            for offset in range(0, len(rows), batch_size):
+                batch = rows[offset:offset + batch_size]
+                chunks, vectors = chunk_articles([(row['title'], row['content']) for row in batch])
+                replace_chunks(conn, [row['id'] for row in batch], chunks, vectors)
+                conn.executemany('UPDATE news SET embedding = NULL, content_hash = ? WHERE id = ?',
+                                 [(content_hash(row['title'], row['content']), row['id']) for row in batch])
+            last_id = rows[-1]['id']
+            processed += len(rows)
+            done_in_run += len(rows)
+            _save_rebuild_checkpoint(conn, last_id, processed)
+            conn.commit()
+            elapsed = time.monotonic() - started
+            logger.info(f"Перестроено {processed} эмбеддингов (id <= {last_id}), "
+                        f"{done_in_run / elapsed if elapsed else 0:.1f} строк/с")
+
+        conn.execute('DELETE FROM embedding_rebuild_checkpoint')
+        conn.commit()
+        logger.info(f"Перестроены эмбеддинги для {processed} новостей")
+
+def chunks_migrated(conn) -> bool:
+    """Метки индекса FAISS — id фрагментов; до migrate_to_chunks это id целых статей."""
+    return conn.execute('PRAGMA user_version').fetchone()[0] >= CHUNKS_VERSION
+
+def check_chunks_migration() -> bool:
+    """При старте только проверяет, нужна ли миграция на фрагменты; True — нужна.
+
+    Сама миграция пересчитывает эмбеддинги всех статей и запускается
+    отдельно (python init_faiss.py), пока сервер ищет по прежнему индексу.
+    """
+    with get_db_connection() as conn:
+        if chunks_migrated(conn):
+            return False
+        if not conn.execute('SELECT 1 FROM news LIMIT 1').fetchone():
+            conn.execute(f'PRAGMA user_version = {CHUNKS_VERSION}')
+            conn.commit()
+            return False
+    logger.warning("Статьи ещё не разбиты на фрагменты: запустите python init_faiss.py. "
+                   "До этого поиск идёт по векторам целых статей из news.embedding")
+    return True
+
+def migrate_to_chunks(batch_size: int = 64, commit_every: int = 1000, resume: bool = True):
+    """Переводит хранилище с одного вектора на статью на векторы фрагментов (из init_faiss.py).
+
+    Индекс фрагментов публикуется вместе со своим пространством меток,
+    поэтому работающий сервер переключается на метки фрагментов ровно
+    тогда, когда подхватывает новый индекс; user_version лишь отмечает,
+    что миграция закончена.
+    """
+    logger.info("Разбиение сохранённых статей на фрагменты...")
+    rebuild_embeddings(batch_size=batch_size, commit_every=commit_every, resume=resume)
+    initialize_faiss_index()
+    with get_db_connection() as conn:
+        conn.execute(f'PRAGMA user_version = {CHUNKS_VERSION}')
+        conn.commit()
+
+def initialize_search_index():
+    """Строит индекс фрагментов, а до migrate_to_chunks — временный индекс целых статей."""
+    with get_db_connection() as conn:
+        migrated = chunks_migrated(conn)
+    if migrated:
+        initialize_faiss_index()
+    else:
+        initialize_article_index()
+
+def initialize_article_index():
+    """Временный индекс до migrate_to_chunks с метками news.id.
+
+    В него попадают векторы целых статей из news.embedding, а у статей,
+    которые прерванная миграция уже разбила на фрагменты, — векторы их
+    фрагментов с меткой статьи.
+    """
+    with get_db_connection() as conn:
+        rows = conn.execute('''SELECT id AS news_id, embedding FROM news WHERE length(embedding) = ?
+                               UNION ALL
+                               SELECT news_id, embedding FROM news_chunks WHERE length(embedding) = ?''',
+                            (EMBEDDING_BYTES, EMBEDDING_BYTES)).fetchall()
+    if not rows:
+        logger.info("Нет эмбеддингов статей для временного индекса FAISS")
+        return
+    ids = np.asarray([row['news_id'] for row in rows], dtype=np.int64)
+    embeddings = decode_embeddings([row['embedding'] for row in rows])
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    spec = choose_index_spec(len(embeddings))
+    index = build_index(embeddings, ids, spec)
+    manager = get_index_manager()
+    with manager.update_lock:
+        manager.publish(index, labels=ARTICLE_LABELS)
+    get_answer_cache().clear()
+    logger.info(f"Временный FAISS индекс целых статей создан: {index.ntotal} векторов, {spec['description']}")
 
 def initialize_faiss_index(force=False):
+    """Строит индекс FAISS по всем фрагментам заново; тип и параметры выбирает choose_index_spec."""
     if force:
         rebuild_embeddings() 
+    manager = get_index_manager()
+    with manager.update_lock:
+        _rebuild_faiss_index(manager)
+
+def _rebuild_faiss_index(manager):
+    """Перестройка индекса из news_chunks; вызывается под manager.update_lock.
+
+    Чтение фрагментов, построение и публикация идут под одной блокировкой:
+    иначе векторы, которые параллельный save_to_database опубликует между
+    чтением и публикацией, были бы затёрты индексом без них.
+    """
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, embedding FROM news WHERE embedding IS NOT NULL ORDER BY id')
-        rows = cursor.fetchall()
-        if not rows:
-            logger.info("Нет данных для создания индекса FAISS")
-            return
-        d = 384  
-        embeddings = []
-        ids = []
-        for row in rows:
-            embedding = pickle.loads(row['embedding'])
-            embeddings.append(embedding)
-            ids.append(row['id'])
-        embeddings = np.array(embeddings, dtype=np.float32)
-        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
-        nlist = min(100, len(embeddings))  
-        index = faiss.IndexFlatIP(d)  
-        if len(embeddings) > 1000:  
-            quantizer = faiss.IndexFlatIP(d)
-            index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
-            index.train(embeddings)
-            index.nprobe = 10
-        index.add(embeddings)
-        faiss.write_index(index, "faiss_index.bin")
-        faiss_to_db = {i: db_id for i, db_id in enumerate(ids)}
-        with open("faiss_to_db.json", "w") as f:
-            import json
-            json.dump(faiss_to_db, f)
-        logger.info(f"FAISS индекс создан: {index.ntotal} векторов")
+        rows = conn.execute('SELECT id, embedding FROM news_chunks WHERE length(embedding) = ? ORDER BY id',
+                            (EMBEDDING_BYTES,)).fetchall()
+    if not rows:
+        logger.info("Нет данных для создания индекса FAISS")
+        return
+    # Метки векторов в индексе — это news_chunks.id
+    ids = np.asarray([row['id'] for row in rows], dtype=np.int64)
+    embeddings = decode_embeddings([row['embedding'] for row in rows])
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    spec = choose_index_spec(len(embeddings))
+    started = time.monotonic()
+    index = build_index(embeddings, ids, spec)
+    manager.publish(index)
+    get_answer_cache().clear()
+    logger.info(f"FAISS индекс создан: {index.ntotal} векторов, {spec['description']} "
+                f"за {time.monotonic() - started:.1f} с")
+
+# Максимум параметров в одном запросе "... IN (...)"
+SQL_IN_CHUNK = 900
+
+def _select_in(conn, sql, values, params=()):
+    """Выполняет sql с "{placeholders}" по частям values и возвращает все строки."""
+    rows = []
+    for offset in range(0, len(values), SQL_IN_CHUNK):
+        chunk = values[offset:offset + SQL_IN_CHUNK]
+        rows.extend(conn.execute(sql.format(placeholders=','.join('?' * len(chunk))), [*chunk, *params]).fetchall())
+    return rows
+
+def _plan_upsert(conn, news_data, hashes):
+    """Решает, какие записи меняет пакет, по двум пакетным выборкам (по title и по url).
+
+    Правила те же, что у прежнего построчного цикла: если есть запись с
+    тем же title (с наименьшим id), то при совпадении url она обновляется;
+    при другом url обновляется запись с этим url, а если её нет — записи
+    с этим title переписывается url; без совпадения по title обновляется
+    запись с тем же url или вставляется новая. Пакет проигрывается по
+    порядку над копией затронутых строк в памяти, поэтому результат тот
+    же, что у последовательной обработки.
+
+    Возвращает (updates, unchanged, inserts): updates — [(id, статья)]
+    для существующих записей с изменённым title+content; unchanged — то же
+    для записей, у которых после всего пакета title+content совпадают с
+    сохранёнными и есть фрагменты: их не нужно эмбеддить заново; inserts —
+    новые статьи в порядке появления. У статей в updates и unchanged есть
+    previous_url — url записи до пакета.
+    """
+    titles = list(dict.fromkeys(news["title"] for news in news_data))
+    urls = list(dict.fromkeys(news["url"] for news in news_data))
+    select = '''SELECT id, title, url, content_hash,
+                        EXISTS (SELECT 1 FROM news_chunks WHERE news_chunks.news_id = news.id) AS has_chunks
+                 FROM news WHERE {column} IN ({{placeholders}})'''
+    rows = {}
+    for row in _select_in(conn, select.format(column='title'), titles) + \
+            _select_in(conn, select.format(column='url'), urls):
+        rows[row['id']] = {"title": row['title'], "url": row['url'], "original_url": row['url'],
+                           "original_hash": row['content_hash'] if row['has_chunks'] else None, "entry": None}
+    ids_by_title = {}
+    for db_id, row in rows.items():
+        ids_by_title.setdefault(row["title"], set()).add(db_id)
+    id_by_url = {row["url"]: db_id for db_id, row in rows.items()}
+
+    def write(key, entry):
+        row = rows[key]
+        ids_by_title[row["title"]].discard(key)
+        ids_by_title.setdefault(entry["title"], set()).add(key)
+        row["title"] = entry["title"]
+        row["entry"] = entry
+
+    for step, (news, digest) in enumerate(zip(news_data, hashes)):
+        title, url = news["title"], news["url"]
+        entry = {"title": title, "content": news["content"], "content_hash": digest}
+        same_title = ids_by_title.get(title)
+        if same_title:
+            key = min(same_title, key=lambda k: k if isinstance(k, tuple) else (0, k))
+            if rows[key]["url"] != url and url not in id_by_url:
+                del id_by_url[rows[key]["url"]]
+                id_by_url[url] = key
+                rows[key]["url"] = url
+            else:
+                key = id_by_url[url]
+        elif url in id_by_url:
+            key = id_by_url[url]
+        else:
+            # Новые записи получают ключи (1, шаг) — после существующих (0, id), как и их будущие id
+            key = (1, step)
+            rows[key] = {"title": title, "url": url, "original_url": None, "original_hash": None, "entry": None}
+            ids_by_title.setdefault(title, set()).add(key)
+            id_by_url[url] = key
+        write(key, entry)
+
+    updates = []
+    unchanged = []
+    inserts = []
+    for key, row in rows.items():
+        if row["entry"] is None:
+            continue
+        entry = dict(row["entry"], url=row["url"], previous_url=row["original_url"])
+        if isinstance(key, tuple):
+            inserts.append((key, entry))
+        elif entry["content_hash"] == row["original_hash"]:
+            # Сравнивается итог пакета: повтор url не вернёт запись к более старой копии статьи
+            unchanged.append((key, entry))
+        else:
+            updates.append((key, entry))
+    inserts.sort(key=lambda item: item[0])
+    return updates, unchanged, [entry for _, entry in inserts]
 
 def save_to_database(news_data):
-    embed_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    if not news_data:
+        return
+    hashes = [content_hash(news["title"], news["content"]) for news in news_data]
+
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        new_embeddings = []
-        new_ids = []
-        updated_ids = []
-        inserted_count = 0
-        updated_count = 0
-        
-        for news in news_data:
-            title = news["title"]
-            content = news["content"]
-            url = news["url"]
-            text = f"{title}\n{content or ''}"
-            embedding = embed_model.get_text_embedding(text) if text.strip() else None
-            embedding_bytes = pickle.dumps(np.array(embedding)) if embedding is not None else None
-            
-            # Проверяем наличие записи с таким title
-            cursor.execute('SELECT id, url FROM news WHERE title = ?', (title,))
-            existing_by_title = cursor.fetchone()
-            
-            if existing_by_title:
-                # Обновляем запись с совпадающим title
-                existing_id, existing_url = existing_by_title['id'], existing_by_title['url']
-                if existing_url == url:
-                    # Тот же url, обновляем content и embedding
-                    cursor.execute('''UPDATE news SET content = ?, embedding = ? WHERE id = ?''',
-                                  (content, embedding_bytes, existing_id))
-                    updated_count += cursor.rowcount
-                    updated_ids.append(existing_id)
-                    new_embeddings.append(embedding)
-                    logger.debug(f"Обновлена запись по title: {title[:50]}..., id: {existing_id}")
-                else:
-                    # Разный url, проверяем конфликт UNIQUE
-                    cursor.execute('SELECT id FROM news WHERE url = ?', (url,))
-                    existing_by_url = cursor.fetchone()
-                    if existing_by_url:
-                        # Конфликт url, обновляем запись с этим url
-                        cursor.execute('''UPDATE news SET title = ?, content = ?, embedding = ? WHERE url = ?''',
-                                      (title, content, embedding_bytes, url))
-                        updated_count += cursor.rowcount
-                        updated_ids.append(existing_by_url['id'])
-                        new_embeddings.append(embedding)
-                        logger.debug(f"Обновлена запись по url: {url}, id: {existing_by_url['id']}")
-                    else:
-                        # Обновляем url для записи с совпадающим title
-                        cursor.execute('''UPDATE news SET content = ?, url = ?, embedding = ? WHERE id = ?''',
-                                      (content, url, embedding_bytes, existing_id))
-                        updated_count += cursor.rowcount
-                        updated_ids.append(existing_id)
-                        new_embeddings.append(embedding)
-                        logger.debug(f"Обновлена запись по title с новым url: {title[:50]}..., id: {existing_id}")
-            else:
-                # Проверяем конфликт url
-                cursor.execute('SELECT id FROM news WHERE url = ?', (url,))
-                existing_by_url = cursor.fetchone()
-                if existing_by_url:
-                    # Обновляем запись с совпадающим url
-                    cursor.execute('''UPDATE news SET title = ?, content = ?, embedding = ? WHERE url = ?''',
-                                  (title, content, embedding_bytes, url))
-                    updated_count += cursor.rowcount
-                    updated_ids.append(existing_by_url['id'])
-                    new_embeddings.append(embedding)
-                    logger.debug(f"Обновлена запись по url: {url}, id: {existing_by_url['id']}")
-                else:
-                    # Вставляем новую запись
-                    cursor.execute('''INSERT INTO news (title, content, url, embedding)
-                                   VALUES (?, ?, ?, ?)''',
-                                  (title, content, url, embedding_bytes))
-                    inserted_count += cursor.rowcount
-
-                    cursor.execute('SELECT id FROM news WHERE url = ?', (url,))
-                    news_id = cursor.fetchone()['id']
-                    new_ids.append(news_id)
-                    new_embeddings.append(embedding)
-                    logger.debug(f"Вставлена новая запись: {title[:50]}..., id: {news_id}")
-        
+        updates, unchanged, inserts = _plan_upsert(conn, news_data, hashes)
+        if unchanged:
+            logger.info(f"Пропущено {len(unchanged)} неизменённых статей")
+        entries = [entry for _, entry in updates] + inserts
+        with stage("embed_chunks"):
+            chunks, vectors = chunk_articles([(entry['title'], entry['content']) for entry in entries])
+
+        with stage("db_write"):
+            # Смена url в два шага: сначала у всех переезжающих записей url сбрасывается в NULL,
+            # затем пишутся итоговые. Иначе при цепочке или обмене url UPDATE займёт url,
+            # который другая запись пакета ещё не освободила, и нарушит UNIQUE(url)
+            conn.executemany('UPDATE news SET url = NULL WHERE id = ?',
+                             [(db_id,) for db_id, entry in updates + unchanged
+                              if entry["url"] != entry["previous_url"]])
+            # Неизменённым статьям — только fetched_at (и url), без эмбеддинга и обновления FAISS
+            conn.executemany('UPDATE news SET url = ?, fetched_at = CURRENT_TIMESTAMP WHERE id = ?',
+                             [(entry["url"], db_id) for db_id, entry in unchanged])
+            conn.executemany('''UPDATE news SET title = ?, content = ?, url = ?, embedding = NULL, content_hash = ?,
+                                      fetched_at = CURRENT_TIMESTAMP WHERE id = ?''',
+                             [(entry["title"], entry["content"], entry["url"], entry["content_hash"], db_id)
+                              for db_id, entry in updates])
+            # ON CONFLICT страхует от записи с тем же url, вставленной параллельно другим запросом.
+            # RETURNING id нельзя получить из executemany, поэтому id читаются одной выборкой по url ниже
+            conn.executemany('''INSERT INTO news (title, content, url, content_hash, fetched_at)
+                                  VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                                  ON CONFLICT(url) DO UPDATE SET title = excluded.title, content = excluded.content,
+                                      embedding = NULL, content_hash = excluded.content_hash,
+                                      fetched_at = excluded.fetched_at''',
+                             [(entry["title"], entry["content"], entry["url"], entry["content_hash"])
+                              for entry in inserts])
+            ids_by_url = {row['url']: row['id'] for row in _select_in(
+                conn, 'SELECT id, url FROM news WHERE url IN ({placeholders})', [entry["url"] for entry in inserts])}
+            news_ids = [db_id for db_id, _ in updates] + [ids_by_url[entry["url"]] for entry in inserts]
+            chunk_ids, removed_chunk_ids = replace_chunks(conn, news_ids, chunks, vectors)
         conn.commit()
-        logger.info(f"Сохранено {inserted_count} новых и обновлено {updated_count} записей в базе данных")
-        
-        # Обновляем FAISS для новых и изменённых записей
-        if new_embeddings and (new_ids or updated_ids):
-            update_faiss_index(new_embeddings, new_ids + updated_ids)
-
-def update_faiss_index(new_embeddings, new_ids):
-    """Добавляет новые эмбеддинги в индекс FAISS."""
-    new_embeddings = np.array(new_embeddings, dtype=np.float32)
+        logger.info(f"Сохранено {len(inserts)} новых и обновлено {len(updates)} записей в базе данных "
+                    f"({len(chunk_ids)} фрагментов)")
+    if not entries:
+        return
+
+    # Обновляем FAISS: новые фрагменты добавляются, фрагменты прежних версий статей удаляются
+    with stage("faiss_update"):
+        update_faiss_index(vectors, chunk_ids, removed_chunk_ids)
+    # Ответы, чья выдача могла измениться из-за этих статей, больше не актуальны
+    get_answer_cache().invalidate(vectors, news_ids)
+
+def get_known_articles(urls, max_age_seconds: float = FRESHNESS_WINDOW_SECONDS) -> dict:
+    """Статьи из хранилища по URL (одним запросом), загруженные не раньше max_age_seconds назад."""
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+    with get_db_connection() as conn:
+        rows = _select_in(conn, '''SELECT id, title, content, url FROM news
+                                  WHERE url IN ({placeholders}) AND fetched_at >= datetime('now', ?)''',
+                          urls, (f"-{int(max_age_seconds)} seconds",))
+    return {row['url']: dict(row) for row in rows}
+
+def update_faiss_index(new_embeddings, new_ids, removed_ids=()):
+    """Вставляет или заменяет векторы в индексе FAISS по id фрагментов в БД; removed_ids удаляются.
+
+    Если корпус дорос до другого типа индекса или IVF пора переобучить,
+    а также если индекс не умеет удалять векторы (HNSW), индекс
+    перестраивается целиком из news_chunks.
+    """
+    # При повторах id в одном пакете побеждает последний вектор
+    latest = {int(db_id): i for i, db_id in enumerate(new_ids)}
+    ids = np.fromiter(latest.keys(), dtype=np.int64, count=len(latest))
+    new_embeddings = np.array([new_embeddings[i] for i in latest.values()], dtype=np.float32).reshape(-1, EMBED_DIM)
     new_embeddings /= np.linalg.norm(new_embeddings, axis=1, keepdims=True)
-    
-    index_file = "faiss_index.bin"
-    if os.path.exists(index_file):
-        index = faiss.read_index(index_file)
-    else:
-        d = 384
-        nlist = 100
-        quantizer = faiss.IndexFlatIP(d)
-        index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
-        index.train(new_embeddings)
-    
-    # Загрузка текущего отображения
-    faiss_to_db = {}
-    if os.path.exists("faiss_to_db.json"):
-        with open("faiss_to_db.json", "r") as f:
-            import json
-            faiss_to_db = json.load(f)
-        faiss_to_db = {int(k): v for k, v in faiss_to_db.items()}
-    
-    # Добавление новых векторов
-    start_idx = index.ntotal
-    index.add(new_embeddings)
-    
-    # Обновление отображения
-    for i, db_id in enumerate(new_ids):
-        faiss_to_db[start_idx + i] = db_id
-    
-    # Сохранение
-    faiss.write_index(index, index_file)
-    with open("faiss_to_db.json", "w") as f:
-        json.dump(faiss_to_db, f)
-    
-    logger.info(f"FAISS индекс обновлён: добавлено {len(new_ids)} векторов")
-
-def fetch_news_from_db(query: str, top_k: int = 10):
-    embed_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    query_embedding = np.array(embed_model.get_text_embedding(query), dtype=np.float32)
-    query_embedding /= np.linalg.norm(query_embedding)
-    index_file = "faiss_index.bin"
-    if not os.path.exists(index_file):
-        logger.warning("FAISS индекс не найден, создаётся новый")
-        initialize_faiss_index()
+    stale_ids = np.union1d(ids, np.asarray(list(removed_ids), dtype=np.int64))
+
+    manager = get_index_manager()
+    with manager.update_lock:
+        current_index, labels = manager.labelled_snapshot()
+        if current_index is not None and labels != CHUNK_LABELS:
+            # Метки фрагментов нельзя смешивать с метками статей во временном индексе;
+            # до конца migrate_to_chunks новые статьи находит BM25
+            logger.info("Индекс FAISS ещё по целым статьям, фрагменты добавит init_faiss.py")
+            return
+        if current_index is None:
+            index = build_index(new_embeddings, ids, choose_index_spec(len(ids)))
+            removed = 0
+        elif not supports_remove(current_index) and len(contained_ids(current_index, stale_ids)):
+            logger.info("Индекс FAISS не поддерживает удаление, перестройка")
+            _rebuild_faiss_index(manager)
+            return
+        else:
+            # Копия при записи: читатели продолжают искать по текущей версии
+            index = faiss.clone_index(current_index)
+            removed = index.remove_ids(stale_ids) if supports_remove(index) else 0
+            if len(ids):
+                index.add_with_ids(new_embeddings, ids)
+        manager.publish(index)
+        logger.info(f"FAISS индекс обновлён: {len(ids)} векторов добавлено, {removed} удалено")
+
+        spec = choose_index_spec(index.ntotal)
+        if needs_rebuild(index, spec):
+            logger.info(f"Корпус вырос до {index.ntotal} векторов, перестройка индекса FAISS как {spec['description']}")
+            # Не отпуская update_lock: обновление, пришедшее во время перестройки, применится после неё
+            _rebuild_faiss_index(manager)
 
-    index = faiss.read_index(index_file)
+def _best_chunks(conn, news_ids, query_embedding=None, query=None):
+    """Лучшие фрагменты каждой статьи: {news_id: (similarity, [фрагменты по порядку в статье])}.
+
+    С эмбеддингом запроса фрагменты ранжируются по косинусу, без него —
+    по числу совпавших с запросом слов; similarity тогда None.
+    """
+    by_news = {}
+    for row in _select_in(conn, '''SELECT news_id, chunk_index, text, embedding FROM news_chunks
+                                   WHERE news_id IN ({placeholders}) ORDER BY news_id, chunk_index''', news_ids):
+        by_news.setdefault(row['news_id'], []).append(row)
+    best = {}
+    for news_id, rows in by_news.items():
+        if query_embedding is not None:
+            # Фрагмент без сохранённого эмбеддинга считается непохожим
+            scores = [float(decode_embeddings([row['embedding']])[0] @ query_embedding)
+                      if row['embedding'] is not None and len(row['embedding']) == EMBEDDING_BYTES else -1.0
+                      for row in rows]
+        else:
+            scores = [lexical_overlap(query, row['text'] or "") for row in rows]
+        top = sorted(range(len(rows)), key=lambda i: scores[i], reverse=True)[:MAX_CHUNKS_PER_ARTICLE]
+        best[news_id] = (
+            max(scores) if query_embedding is not None else None,
+            [rows[i]['text'] for i in sorted(top)],
+        )
+    return best
+
+def _whole_articles(conn, news_ids, query_embedding=None):
+    """Статьи без фрагментов (ещё не прошедшие migrate_to_chunks) целиком: {news_id: (similarity, [текст])}.
+
+    similarity считается по вектору целой статьи в news.embedding, если он есть.
+    """
+    whole = {}
+    for row in _select_in(conn, 'SELECT id, content, embedding FROM news WHERE id IN ({placeholders})', news_ids):
+        similarity = None
+        if query_embedding is not None and row['embedding'] is not None and len(row['embedding']) == EMBEDDING_BYTES:
+            similarity = float(decode_embeddings([row['embedding']])[0] @ query_embedding)
+        whole[row['id']] = (similarity, [row['content'] or ""])
+    return whole
+
+def _hydrate_news(conn, ranked, query_embedding=None, query=None):
+    """Статьи по [(id, score)] в том же порядке с лучшими фрагментами вместо полного текста.
+
+    similarity — косинус запроса с лучшим фрагментом статьи, если задан эмбеддинг запроса.
+    """
+    ids = [db_id for db_id, _ in ranked]
+    rows = {row['id']: row for row in _select_in(
+        conn, 'SELECT id, title, url FROM news WHERE id IN ({placeholders})', ids)}
+    best = _best_chunks(conn, ids, query_embedding, query)
+    missing = [db_id for db_id in ids if db_id not in best]
+    if missing:
+        best.update(_whole_articles(conn, missing, query_embedding))
+    results = []
+    for db_id, score in ranked:
+        row = rows.get(db_id)
+        if row is None or db_id not in best:
+            continue
+        similarity, chunks = best[db_id]
+        results.append({
+            "id": row["id"],
+            "title": row["title"],
+            "content": "\n...\n".join(chunk for chunk in chunks if chunk),
+            "chunks": chunks,
+            "url": row["url"],
+            "similarity": similarity,
+            "score": score,
+        })
+    return results
+
+def fetch_news_lexical(query: str, top_k: int = 10):
+    """Только BM25 по news_fts, без модели эмбеддингов; similarity у результатов — None."""
+    with get_db_connection() as conn:
+        with stage("fts_search"):
+            ranked = search_fts(conn, query, top_k)
+        with stage("hydrate"):
+            results = _hydrate_news(conn, ranked, query=query)
+    logger.info(f"Найдено {len(results)} статей по ключевым словам для запроса: {query}")
+    return results
+
+def fetch_news_from_db(query: str, top_k: int = 10, query_embedding: np.ndarray = None,
+                       nprobe: int = None, ef_search: int = None):
+    """Гибридный поиск: кандидаты FAISS и BM25 объединяются через reciprocal rank fusion.
+
+    FAISS ищет по фрагментам; статья получает позицию своего лучшего
+    фрагмента. Короткие запросы из ключевых слов без готового эмбеддинга
+    сначала ищутся только по BM25 — модель эмбеддингов тогда не вызывается.
+    nprobe/ef_search задают точность FAISS для этого запроса.
+    """
+    if query_embedding is None:
+        if is_keyword_query(query):
+            results = fetch_news_lexical(query, top_k)
+            if results:
+                return results
+        with stage("embed_query"):
+            query_embedding = get_embedding_service().embed_one(query)
+    manager = get_index_manager()
+    if manager.ntotal == 0:
+        logger.warning("FAISS индекс не найден, создаётся новый")
+        initialize_search_index()
 
-    with open("faiss_to_db.json", "r") as f:
-        import json
-        faiss_to_db = json.load(f)
-        faiss_to_db = {int(k): v for k, v in faiss_to_db.items()}
-    distances, faiss_indices = index.search(query_embedding.reshape(1, -1), top_k)
+    candidates = top_k * HYBRID_CANDIDATES_FACTOR
+    with stage("faiss_search"):
+        _, labels, label_space = manager.search(
+            query_embedding, candidates * MAX_CHUNKS_PER_ARTICLE, nprobe=nprobe, ef_search=ef_search)
+    labels = [int(label) for label in labels if label != -1]
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        db_ids_from_faiss = [faiss_to_db.get(i, -1) for i in faiss_indices[0]]
-        valid_db_ids = [idx for idx in db_ids_from_faiss if idx != -1]
-        if not valid_db_ids:
+        if label_space == CHUNK_LABELS:
+            news_by_chunk = {row['id']: row['news_id'] for row in _select_in(
+                conn, 'SELECT id, news_id FROM news_chunks WHERE id IN ({placeholders})', labels)}
+            vector_ranking = list(dict.fromkeys(
+                news_by_chunk[label] for label in labels if label in news_by_chunk))[:candidates]
+        else:
+            # Временный индекс до migrate_to_chunks: метки — news.id целых статей
+            vector_ranking = list(dict.fromkeys(labels))[:candidates]
+        with stage("fts_search"):
+            lexical_ranking = [db_id for db_id, _ in search_fts(conn, query, candidates)]
+        fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking])[:top_k]
+        if not fused:
             logger.warning("Не найдено соответствующих записей в БД для индексов FAISS")
             return []
-        placeholders = ','.join('?' * len(valid_db_ids))
-        cursor.execute(f'SELECT id, title, content, url FROM news WHERE id IN ({placeholders})', valid_db_ids)
-        rows = cursor.fetchall()
-        row_dict = {row['id']: row for row in rows}
-        results = []
-        for i, faiss_idx in enumerate(faiss_indices[0]):
-            db_id = faiss_to_db.get(faiss_idx)
-            if db_id is not None and db_id in row_dict:
-                row = row_dict[db_id]
-                print (row["title"])
-                results.append({
-                    "id": row["id"],
-                    "title": row["title"],
-                    "content": row["content"],
-                    "url": row["url"],
-                    
-                    "similarity": float(distances[0][i])
-                })
-        results.sort(key=lambda x: x['similarity'], reverse=True)
-        logger.info(f"Найдено {len(results)} похожих статей для запроса: {query}")
-        return results
\ No newline at end of file
+        with stage("hydrate"):
+            results = _hydrate_news(conn, fused, query_embedding)
+    logger.info(f"Найдено {len(results)} похожих статей для запроса: {query} "
+                f"(FAISS: {len(vector_ranking)}, BM25: {len(lexical_ranking)})")
+    return results
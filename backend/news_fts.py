@@ -0,0 +1,123 @@
+import logging
+import re
+
+logger = logging.getLogger("news_fts")
+
+# Запросы не длиннее стольких значимых слов считаются ключевыми словами
+KEYWORD_QUERY_MAX_TOKENS = 3
+# Параметр k из reciprocal rank fusion: чем больше, тем ровнее вклад нижних позиций
+RRF_K = 60
+# Вес совпадений в заголовке относительно текста статьи для bm25()
+TITLE_WEIGHT = 2.0
+# Слова-связки, которые не несут смысла для поиска по ключевым словам
+STOPWORDS = {
+    "а", "в", "во", "и", "к", "ко", "на", "не", "о", "об", "от", "по", "с", "со", "у", "за", "из",
+    "для", "до", "как", "какие", "какой", "что", "это", "ли", "же", "или", "но", "про", "при",
+    "новое", "нового", "новости", "новостей", "тема", "теме", "теми", "сегодня", "последние",
+}
+
+# Внешнее содержимое: текст хранится только в news, FTS держит индекс по news.id
+_SCHEMA = (
+    '''CREATE VIRTUAL TABLE news_fts USING fts5(
+           title, content, content='news', content_rowid='id',
+           tokenize='unicode61 remove_diacritics 2')''',
+    '''CREATE TRIGGER IF NOT EXISTS news_fts_insert AFTER INSERT ON news BEGIN
+           INSERT INTO news_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS news_fts_delete AFTER DELETE ON news BEGIN
+           INSERT INTO news_fts (news_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS news_fts_update AFTER UPDATE OF title, content ON news BEGIN
+           INSERT INTO news_fts (news_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+           INSERT INTO news_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+       END''',
+)
+
+
+def create_fts_index(conn) -> bool:
+    """Создаёт news_fts и триггеры синхронизации; существующие статьи индексируются один раз.
+
+    Возвращает False, если SQLite собран без FTS5 — тогда поиск остаётся чисто векторным.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'news_fts'"
+    ).fetchone()
+    if exists:
+        return True
+    try:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        conn.execute("INSERT INTO news_fts (news_fts) VALUES ('rebuild')")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.warning(f"Полнотекстовый индекс недоступен: {str(e)}")
+        return False
+    logger.info("Полнотекстовый индекс news_fts создан")
+    return True
+
+
+def query_terms(query: str) -> list:
+    return [
+        term for term in re.findall(r"\w+", query.lower())
+        if len(term) > 1 and term not in STOPWORDS
+    ]
+
+
+def is_keyword_query(query: str) -> bool:
+    """Короткий запрос из ключевых слов (имена, организации, места).
+
+    Считаются только значимые слова: обёртка чата "Что нового в теме '...'?"
+    состоит из стоп-слов и не мешает искать такой вопрос по BM25.
+    """
+    return 0 < len(query_terms(query)) <= KEYWORD_QUERY_MAX_TOKENS
+
+
+def _term_pattern(term: str) -> str:
+    # unicode61 не знает русской морфологии, поэтому у длинных слов отбрасывается окончание
+    return term[:-2] if len(term) > 5 else term
+
+
+def lexical_overlap(query: str, text: str) -> int:
+    """Сколько терминов запроса встречается в тексте (с той же обрезкой окончаний, что в MATCH)."""
+    text = text.lower()
+    return sum(1 for term in dict.fromkeys(query_terms(query)) if _term_pattern(term) in text)
+
+
+def fts_match_expression(query: str) -> str:
+    """Выражение MATCH: термины через OR, длинные слова — префиксом без окончания.
+
+    unicode61 не знает русской морфологии, поэтому "Путина" ищется как
+    "Пути*", чтобы находить и "Путин", и "Путиным".
+    """
+    terms = []
+    for term in dict.fromkeys(query_terms(query)):
+        pattern = _term_pattern(term)
+        terms.append(f'"{pattern}"*' if pattern != term else f'"{term}"')
+    return " OR ".join(terms)
+
+
+def search_fts(conn, query: str, limit: int) -> list:
+    """[(news.id, score)] по BM25, лучшие первыми; score больше — лучше."""
+    expression = fts_match_expression(query)
+    if not expression:
+        return []
+    try:
+        rows = conn.execute(
+            f'''SELECT rowid, bm25(news_fts, {TITLE_WEIGHT}, 1.0) AS rank FROM news_fts
+                WHERE news_fts MATCH ? ORDER BY rank LIMIT ?''',
+            (expression, limit),
+        ).fetchall()
+    except Exception as e:
+        logger.warning(f"Ошибка полнотекстового поиска для '{query}': {str(e)}")
+        return []
+    return [(row[0], -row[1]) for row in rows]
+
+
+def reciprocal_rank_fusion(rankings, k: int = RRF_K) -> list:
+    """Объединяет списки id (лучшие первыми) в [(id, score)] по сумме 1 / (k + позиция)."""
+    scores = {}
+    for ranking in rankings:
+        for position, db_id in enumerate(ranking, start=1):
+            scores[db_id] = scores.get(db_id, 0.0) + 1.0 / (k + position)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
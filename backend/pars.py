@@ -1,86 +1,167 @@
-import requests
+import asyncio
 import logging
+import os
 import re
+from urllib.parse import urlsplit
 from bs4 import BeautifulSoup
 from llama_index.core import Document
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-import time
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 
-from news_db_utils import save_to_database
+from browser_pool import get_browser_pool
+from news_db_utils import save_to_database, get_known_articles, FRESHNESS_WINDOW_SECONDS
+from executors import run_cpu, run_blocking
+from rate_limiter import HostRateLimiter
+from http_client import get_http_client
+from fetch_tiers import DomainTierPolicy, TIER_STATIC, TIER_BROWSER, TIER_META
+from ttl_cache import TTLCache
+from metrics import stage
 
 logger = logging.getLogger("pars")
 
+# Адреса внешних сервисов переопределяются переменными окружения (например, заглушками нагрузочного теста)
+RIA_SEARCH_URL = os.environ.get("RIA_SEARCH_URL", "https://ria.ru/search/")
+# Не больше 1 запроса в секунду к одному хосту после начального всплеска из 3
+RATE_LIMITER = HostRateLimiter(default_rate=1.0, default_burst=3)
+TIER_POLICY = DomainTierPolicy()
+# Страницы результатов поиска по одной и той же строке запроса переиспользуются 5 минут
+SEARCH_CACHE = TTLCache(ttl=300)
 
-def search_ria_simple(query: str, limit: int = 3):
+
+async def fetch_static(url: str) -> str:
+    """Статический уровень: HTTP GET и поиск тела статьи без браузера."""
     try:
-        session = requests.Session()
-        retries = Retry(
-            total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504]
-        )
-        session.mount("http://", HTTPAdapter(max_retries=retries))
-        session.mount("https://", HTTPAdapter(max_retries=retries))
+        response = await get_http_client().get(url, timeout=10)
+        response.raise_for_status()
+        soup = await run_cpu(BeautifulSoup, response.text, "lxml")
+        return await run_cpu(extract_content, soup, url, require_article=True)
+    except Exception as e:
+        logger.warning(f"Статическая загрузка не удалась для {url}: {str(e)}")
+        return ""
 
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
-        response = session.get(
-            f"https://ria.ru/search/?query={query}", headers=headers, timeout=15
+
+async def fetch_article(url: str):
+    """Загружает статью по уровням: статический HTML, затем браузер, затем meta-описание."""
+    domain = urlsplit(url).hostname or ""
+    if TIER_POLICY.should_try_static(domain):
+        await RATE_LIMITER.acquire(url)
+        with stage("scrape_static"):
+            content = await fetch_static(url)
+        TIER_POLICY.record(domain, TIER_STATIC, bool(content))
+        if content:
+            return content
+
+    await RATE_LIMITER.acquire(url)
+    with stage("scrape_browser"):
+        content = await run_blocking(fetch_with_selenium, url)
+    TIER_POLICY.record(domain, TIER_BROWSER, bool(content))
+    if content:
+        return content
+
+    logger.warning(f"Контент отсутствует для статьи: {url}")
+    await RATE_LIMITER.acquire(url)
+    with stage("scrape_meta"):
+        content = await extract_meta_description(url)
+    TIER_POLICY.record(domain, TIER_META, bool(content))
+    return content or "Контент недоступен"
+
+
+def get_scraping_stats() -> dict:
+    return {
+        "tiers": TIER_POLICY.stats(),
+        "browser_pool": get_browser_pool().stats(),
+        "http": get_http_client().stats(),
+        "search_cache": SEARCH_CACHE.stats(),
+    }
+
+
+async def get_ria_hits(query: str, limit: int) -> list:
+    """Список (title, url) из поиска RIA; повторный запрос той же строки берётся из SEARCH_CACHE."""
+    cache_key = ("ria", query, limit)
+    hits = SEARCH_CACHE.get(cache_key)
+    if hits is not None:
+        return hits
+
+    await RATE_LIMITER.acquire(RIA_SEARCH_URL)
+    with stage("ria_search"):
+        response = await get_http_client().get(
+            RIA_SEARCH_URL, params={"query": query}, timeout=15
         )
-        soup = BeautifulSoup(response.text, "lxml")
-        results = []
-        news_data = []
+        # Страница ошибки разобралась бы в пустую выдачу и осталась бы в SEARCH_CACHE на весь TTL
+        response.raise_for_status()
+    soup = await run_cpu(BeautifulSoup, response.text, "lxml")
 
-        for item in soup.find_all("div", class_="list-item", limit=limit):
-            try:
-                title = item.find("a", class_="list-item__title").get_text(strip=True)
-                url = item.find("a")["href"]
-                content = fetch_with_selenium(url)
+    hits = []
+    for item in soup.find_all("div", class_="list-item", limit=limit):
+        try:
+            title = item.find("a", class_="list-item__title").get_text(strip=True)
+            hits.append((title, item.find("a")["href"]))
+        except Exception as e:
+            logger.error(f"Ошибка разбора результата поиска RIA: {str(e)}")
+    SEARCH_CACHE.put(cache_key, hits)
+    return hits
 
-                if not content:
-                    logger.warning(f"Контент отсутствует для статьи: {url}")
-                    content = extract_meta_description(url) or "Контент недоступен"
 
-                news_data.append(
-                    {"title": title, "url": url, "content": content[:2000], "date": ""}
-                )
+async def search_ria_simple(query: str, limit: int = 3, article_timeout: float = 30):
+    try:
+        hits = await get_ria_hits(query, limit)
+
+        # Статьи, загруженные в пределах FRESHNESS_WINDOW_SECONDS, не скачиваются и не эмбеддятся заново
+        known = await run_blocking(get_known_articles, [url for title, url in hits], FRESHNESS_WINDOW_SECONDS)
+        to_fetch = [(title, url) for title, url in hits if url not in known]
+
+        # Статьи загружаются параллельно; вежливость к ria.ru обеспечивает RATE_LIMITER
+        contents = await asyncio.gather(
+            *(
+                asyncio.wait_for(fetch_article(url), article_timeout)
+                for title, url in to_fetch
+            ),
+            return_exceptions=True,
+        )
+        fetched = dict(zip((url for title, url in to_fetch), contents))
+
+        results = []
+        news_data = []
+        failed = 0
+        # Результаты идут в порядке выдачи поиска: сохранённые статьи вперемешку с загруженными
+        for title, url in hits:
+            if url in known:
                 results.append(
-                    Document(text=content, metadata={"title": title, "url": url})
+                    Document(text=known[url]["content"], metadata={"title": title, "url": url})
                 )
-                time.sleep(1)
-            except Exception as e:
-                logger.error(f"Ошибка обработки статьи {url}: {str(e)}")
                 continue
+            content = fetched[url]
+            if isinstance(content, BaseException):
+                failed += 1
+                reason = "таймаут" if isinstance(content, asyncio.TimeoutError) else str(content)
+                logger.error(f"Ошибка обработки статьи {url}: {reason}")
+                continue
+            news_data.append(
+                {"title": title, "url": url, "content": content, "date": ""}
+            )
+            results.append(
+                Document(text=content, metadata={"title": title, "url": url})
+            )
 
         if news_data:
             logger.debug(f"Подготовлено {len(news_data)} статей для сохранения из RIA")
-            save_to_database(news_data)
-
-        return results, {"status": "success", "results_count": len(results)}
+            await run_cpu(save_to_database, news_data)
+
+        return results, {
+            "status": "success",
+            "results_count": len(results),
+            "cached_count": len(known),
+            "failed_count": failed,
+            "partial": failed > 0,
+        }
 
     except Exception as e:
         logger.error(f"Ошибка RIA: {str(e)}")
         return [], {"status": "error", "message": str(e)}
 
 
-def extract_meta_description(url: str) -> str:
+async def extract_meta_description(url: str) -> str:
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
-        session = requests.Session()
-        retries = Retry(
-            total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504]
-        )
-        session.mount("http://", HTTPAdapter(max_retries=retries))
-        session.mount("https://", HTTPAdapter(max_retries=retries))
-        response = session.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.text, "lxml")
+        response = await get_http_client().get(url, timeout=10)
+        soup = await run_cpu(BeautifulSoup, response.text, "lxml")
         meta = (
             soup.find("meta", attrs={"name": "description"})
             or soup.find("meta", attrs={"property": "og:description"})
@@ -94,24 +175,9 @@ def extract_meta_description(url: str) -> str:
 
 def fetch_with_selenium(url: str) -> str:
     try:
-        options = Options()
-        options.add_argument("--headless")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--enable-unsafe-swiftshader")  # Подавление ошибок WebGL
-        driver = webdriver.Chrome(options=options)
-
-        driver.get(url)
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located(
-                (
-                    By.CSS_SELECTOR,
-                    'div.article__body, article, div[class*="article"], div[class*="content"]',
-                )
-            )
-        )
-        soup = BeautifulSoup(driver.page_source, "lxml")
-        driver.quit()
+        # Браузер берётся из пула и возвращается в него даже при ошибке
+        page_source = get_browser_pool().fetch_page_source(url)
+        soup = BeautifulSoup(page_source, "lxml")
 
         return extract_content(soup, url)
 
@@ -120,7 +186,8 @@ def fetch_with_selenium(url: str) -> str:
         return ""
 
 
-def extract_content(soup: BeautifulSoup, url: str) -> str:
+def extract_content(soup: BeautifulSoup, url: str, require_article: bool = False) -> str:
+    """Извлекает текст статьи; при require_article=True не откатывается на весь <body>."""
     try:
         for element in soup(
             [
@@ -154,7 +221,7 @@ def extract_content(soup: BeautifulSoup, url: str) -> str:
             or soup.find("div", {"itemprop": "articleBody"})
             or soup.find("article")
             or soup.find(class_=["article-body", "text"])
-            or soup.body
+            or (None if require_article else soup.body)
         )
 
         if article_body:
@@ -174,6 +241,8 @@ def extract_content(soup: BeautifulSoup, url: str) -> str:
             text = article_body.get_text(separator="\n", strip=True)
             return text if len(text) > 50 else ""
 
+        if require_article:
+            return ""
         logger.warning(f"Не удалось найти тело статьи: {url}")
         debug_filename = f"debug_{url.replace('/', '_')}.html"
         with open(debug_filename, "w", encoding="utf-8") as f:
@@ -186,11 +255,11 @@ def extract_content(soup: BeautifulSoup, url: str) -> str:
         return ""
 
 
-NEWSAPI_KEY = "c8a806f519af421d831c8cdc2de5b2ce"
-BASE_URL = "https://newsapi.org/v2/everything"
+NEWSAPI_KEY = os.environ.get("NEWSAPI_KEY", "c8a806f519af421d831c8cdc2de5b2ce")
+BASE_URL = os.environ.get("NEWSAPI_URL", "https://newsapi.org/v2/everything")
 
 
-def search_newsapi_simple(query: str, limit: int = 5):
+async def search_newsapi_simple(query: str, limit: int = 5):
     try:
         logger.info(f"Поиск через NewsAPI.org: {query}")
         params = {
@@ -200,17 +269,21 @@ def search_newsapi_simple(query: str, limit: int = 5):
             "pageSize": limit,
             "language": "ru",
         }
-        session = requests.Session()
-        retries = Retry(
-            total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504]
+        cache_key = ("newsapi", query, limit)
+        data = SEARCH_CACHE.get(cache_key)
+        if data is None:
+            with stage("newsapi_search"):
+                response = await get_http_client().get(BASE_URL, params=params, timeout=15)
+                response.raise_for_status()
+            data = response.json()
+            if data["status"] != "ok":
+                raise Exception(f"Ошибка API: {data.get('message', 'Неизвестная ошибка')}")
+            SEARCH_CACHE.put(cache_key, data)
+
+        articles = [article for article in data.get("articles", [])[:limit] if isinstance(article, dict)]
+        known = await run_blocking(
+            get_known_articles, [article.get("url", "") for article in articles], FRESHNESS_WINDOW_SECONDS
         )
-        session.mount("http://", HTTPAdapter(max_retries=retries))
-        session.mount("https://", HTTPAdapter(max_retries=retries))
-        response = session.get(BASE_URL, params=params, timeout=15)
-        response.raise_for_status()
-        data = response.json()
-        if data["status"] != "ok":
-            raise Exception(f"Ошибка API: {data.get('message', 'Неизвестная ошибка')}")
 
         results = []
         news_data = []
@@ -232,6 +305,15 @@ def search_newsapi_simple(query: str, limit: int = 5):
                     continue
 
                 date = article.get("publishedAt", "")
+                if url in known:
+                    results.append(
+                        Document(
+                            text=known[url]["content"],
+                            metadata={"title": title, "url": url, "date": date},
+                        )
+                    )
+                    continue
+
                 content = clean_content(article.get("content", ""))
                 description = clean_content(article.get("description", ""))
 
@@ -247,12 +329,12 @@ def search_newsapi_simple(query: str, limit: int = 5):
                         f"Контент и описание слишком короткие для статьи: {url}"
                     )
                     selected_text = (
-                        extract_meta_description(url) or "Контент недоступен"
+                        await extract_meta_description(url) or "Контент недоступен"
                     )
 
                 news_entry = {
                     "title": title,
-                    "content": selected_text[:2000],
+                    "content": selected_text,
                     "url": url,
                     "date": date,
                 }
@@ -273,9 +355,13 @@ def search_newsapi_simple(query: str, limit: int = 5):
 
         logger.debug(f"Подготовлено {len(news_data)} статей для сохранения из NewsAPI")
         if news_data:
-            save_to_database(news_data)
+            await run_cpu(save_to_database, news_data)
 
-        return results, {"status": "success", "results_count": len(results)}
+        return results, {
+            "status": "success",
+            "results_count": len(results),
+            "cached_count": len(known),
+        }
 
     except Exception as e:
         logger.error(f"Ошибка при запросе к NewsAPI.org: {str(e)}")
@@ -1,14 +1,37 @@
+import json
 import logging
+import time
 import uuid
 from datetime import datetime
-from typing import Dict, Any
-from fastapi import FastAPI, HTTPException, Body
+from typing import Dict, Any, Optional
+from fastapi import FastAPI, HTTPException, Body, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-
-from llama_index_utils import setup_settings, process_news_with_llm
-from pars import search_ria_simple, search_newsapi_simple
-from db_utils import create_application_logs, insert_application_logs, get_chat_history
-from news_db_utils import initialize_database, update_database_schema
+from fastapi.responses import StreamingResponse, PlainTextResponse
+
+from llama_index_utils import setup_settings, process_news_with_llm, stream_news_with_llm
+from pars import search_ria_simple, search_newsapi_simple, get_scraping_stats, SEARCH_CACHE, TIER_POLICY
+from db_utils import (
+    create_application_logs,
+    insert_application_logs,
+    get_chat_history,
+    get_recent_chat_history,
+    close_db_pool,
+)
+from news_db_utils import initialize_database, close_db_connections, fetch_news_from_db
+from executors import run_cpu, run_blocking, shutdown_executors
+from browser_pool import close_browser_pool
+from http_client import close_http_client
+from answer_cache import get_answer_cache
+from ingest_queue import IngestJobQueue, QueueFullError
+from faiss_index_manager import get_index_manager
+from metrics import (
+    REGISTRY,
+    HTTP_SECONDS,
+    PROMETHEUS_CONTENT_TYPE,
+    SERVER_TIMING_ENABLED,
+    start_request_timings,
+    server_timing_header,
+)
 
 
 # Инициализируем логгер глобально или передаем его
@@ -32,6 +55,13 @@ def configure_logging():
 # Раскомментируем FastAPI приложение
 app = FastAPI()
 
+# Скачивание и индексация статей идут в фоне; поиск отвечает тем, что уже есть в базе
+ingest_queue = IngestJobQueue(
+    {"ria": search_ria_simple, "newsapi": search_newsapi_simple}, workers=2
+)
+# Сколько ждать задание, если клиент передал "wait": true
+INGEST_WAIT_TIMEOUT = 60
+
 # Добавляем CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -42,6 +72,86 @@ app.add_middleware(
 )
 
 
+def observe_request(request: Request, status: int, started: float):
+    # Шаблон пути, а не сам путь: /ingest-jobs/{job_id} не плодит серии на каждый id
+    route = request.scope.get("route")
+    HTTP_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                         path=getattr(route, "path", "unmatched"), status=status)
+
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Длительность запроса по шаблону маршрута и, при SERVER_TIMING=1, заголовок Server-Timing.
+
+    Длительность фиксируется после отправки тела ответа: у потоковых
+    ответов (/news-chat-stream) в неё входит вся генерация, а не только
+    время до заголовков.
+    """
+    timings = start_request_timings()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        observe_request(request, 500, started)
+        raise
+    body = response.body_iterator
+
+    async def observed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            observe_request(request, response.status_code, started)
+
+    response.body_iterator = observed_body()
+    if SERVER_TIMING_ENABLED:
+        # У потоковых ответов заголовок уходит до генерации, в нём только этапы до первого байта
+        timings.append(("total", time.perf_counter() - started))
+        response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+
+def collect_app_metrics():
+    """Семейства для /metrics из статистики индекса, кэшей, загрузки статей и очереди."""
+    yield "rag_faiss_index_vectors", "gauge", "Векторов в индексе FAISS", [({}, get_index_manager().ntotal)]
+
+    answer_cache = get_answer_cache().stats()
+    yield "rag_answer_cache_lookups_total", "counter", "Обращения к семантическому кэшу ответов", [
+        ({"result": "hit"}, answer_cache["hits"]),
+        ({"result": "miss"}, answer_cache["misses"]),
+    ]
+    yield "rag_answer_cache_hit_ratio", "gauge", "Доля попаданий в кэш ответов", [({}, answer_cache["hit_ratio"])]
+    yield "rag_answer_cache_entries", "gauge", "Записей в кэше ответов", [({}, answer_cache["entries"])]
+
+    search_cache = SEARCH_CACHE.stats()
+    yield "rag_search_cache_lookups_total", "counter", "Обращения к кэшу страниц поиска RIA/NewsAPI", [
+        ({"result": "hit"}, search_cache["hits"]),
+        ({"result": "miss"}, search_cache["misses"]),
+    ]
+    yield "rag_search_cache_hit_ratio", "gauge", "Доля попаданий в кэш поиска", [({}, search_cache["hit_ratio"])]
+
+    # TIER_POLICY напрямую: get_scraping_stats запустил бы пул браузеров ради статистики
+    tiers = TIER_POLICY.stats()
+    yield "rag_scrape_tier_total", "counter", "Попытки загрузки статей по уровням", [
+        ({"tier": key.rsplit("_", 1)[0], "outcome": key.rsplit("_", 1)[1]}, value)
+        for key, value in tiers["totals"].items()
+    ]
+    yield "rag_scrape_tier_hit_ratio", "gauge", "Доля статей, полученных на каждом уровне", [
+        ({"tier": tier}, ratio) for tier, ratio in tiers["hit_rates"].items()
+    ]
+
+    queue = ingest_queue.stats()
+    yield "rag_ingest_jobs", "gauge", "Задания загрузки в памяти по статусам", [
+        ({"status": status}, count) for status, count in queue["jobs"].items()
+    ]
+    yield "rag_ingest_jobs_total", "counter", "Задания загрузки с момента запуска", [
+        ({"event": event}, queue[event]) for event in ("submitted", "deduplicated", "rejected", "done", "failed")
+    ]
+
+
+REGISTRY.register_collector(collect_app_metrics)
+
+
 @app.on_event("startup")
 async def startup_event():
     configure_logging()
@@ -50,18 +160,55 @@ async def startup_event():
     else:
         print("Logger не сконфигурирован перед startup_event")
 
-    setup_settings()
-    create_application_logs()
-    initialize_database()
-    update_database_schema()
+    await run_cpu(setup_settings)
+    await create_application_logs()
+    await run_cpu(initialize_database)
+    await ingest_queue.start()
     if logger:
         logger.info("Инициализация завершена.")
     else:
         print("Инициализация завершена (logger не доступен).")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ingest_queue.stop()
+    await close_http_client()
+    await run_blocking(close_browser_pool)
+    shutdown_executors()
+    close_db_connections()
+    await close_db_pool()
+
+
+async def enqueue_search(kind: str, question: str, limit: int, wait: bool):
+    """Ставит загрузку в очередь и возвращает (задание, уже известные статьи по запросу)."""
+    job = ingest_queue.submit(kind, question, limit)
+    if wait:
+        job = await ingest_queue.wait(job["job_id"], timeout=INGEST_WAIT_TIMEOUT)
+    known = await run_cpu(fetch_news_from_db, question, limit)
+    return job, known
+
+
+def search_response(source: str, job: dict, known: list, session_id: str) -> Dict[str, Any]:
+    return {
+        "message": f"Found {len(known)} known articles, {source} ingestion {job['status']}",
+        "partial": job["status"] != "done",
+        "results": [
+            {
+                "title": news["title"],
+                "url": news["url"],
+                "content": (news["content"] or "")[:200] + "...",
+            }
+            for news in known
+        ],
+        "job_id": job["job_id"],
+        "job_status": job["status"],
+        "session_id": session_id,
+    }
+
+
 @app.post("/search-ria")
-def search_ria(body: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
+async def search_ria(body: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
     question = body.get("question")
     session_id = body.get("session_id") or str(uuid.uuid4())
     model = body.get("model", "llama3.2:3b")
@@ -83,30 +230,18 @@ def search_ria(body: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
         )
 
     try:
-        results, meta = search_ria_simple(question, limit=3)
-        if meta["status"] == "error":
-            if logger:
-                logger.error(f"RIA Search failed: {meta['message']}")
-            raise HTTPException(
-                status_code=500, detail=f"RIA Search failed: {meta['message']}"
-            )
-
+        job, known = await enqueue_search("ria", question, 3, body.get("wait", False))
         if logger:
             logger.info(
-                f"Session ID: {session_id}, RIA Search Results: {meta['results_count']} articles found"
+                f"Session ID: {session_id}, RIA ingest job {job['job_id']}: {job['status']}, known articles: {len(known)}"
             )
-        return {
-            "message": f"Found {meta['results_count']} articles from RIA.ru",
-            "results": [
-                {
-                    "title": doc.metadata["title"],
-                    "url": doc.metadata["url"],
-                    "content": doc.text[:200] + "...",
-                }
-                for doc in results
-            ],
-            "session_id": session_id,
-        }
+        if job["status"] == "failed" and logger:
+            logger.warning(
+                f"Session ID: {session_id}, RIA Search failed: {job['error']}"
+            )
+        return search_response("RIA.ru", job, known, session_id)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         if logger:
             logger.error(f"Session ID: {session_id}, RIA Search error: {str(e)}")
@@ -116,7 +251,7 @@ def search_ria(body: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
 
 
 @app.post("/search-newsapi")
-def search_newsapi(
+async def search_newsapi(
     body: Dict[str, Any] = Body(...),
     from_date: str = datetime.now().strftime("%Y-%m-%d"),
 ) -> Dict[str, Any]:
@@ -143,30 +278,18 @@ def search_newsapi(
         )
 
     try:
-        results, meta = search_newsapi_simple(question, limit=5)
-        if meta["status"] == "error":
-            if logger:
-                logger.error(f"NewsAPI Search failed: {meta['message']}")
-            raise HTTPException(
-                status_code=500, detail=f"NewsAPI Search failed: {meta['message']}"
-            )
-
+        job, known = await enqueue_search("newsapi", question, 5, body.get("wait", False))
         if logger:
             logger.info(
-                f"Session ID: {session_id}, NewsAPI Search Results: {meta['results_count']} articles found"
+                f"Session ID: {session_id}, NewsAPI ingest job {job['job_id']}: {job['status']}, known articles: {len(known)}"
             )
-        return {
-            "message": f"Found {meta['results_count']} articles from NewsAPI.org",
-            "results": [
-                {
-                    "title": doc.metadata["title"],
-                    "url": doc.metadata["url"],
-                    "content": doc.text[:200] + "...",
-                }
-                for doc in results
-            ],
-            "session_id": session_id,
-        }
+        if job["status"] == "failed" and logger:
+            logger.warning(
+                f"Session ID: {session_id}, NewsAPI Search failed: {job['error']}"
+            )
+        return search_response("NewsAPI.org", job, known, session_id)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         if logger:
             logger.error(f"Session ID: {session_id}, NewsAPI Search error: {str(e)}")
@@ -176,7 +299,7 @@ def search_newsapi(
 
 
 @app.post("/news-chat")
-def news_chat(body: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
+async def news_chat(body: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
     question = body.get("question")
     session_id = body.get("session_id") or str(uuid.uuid4())
     model = body.get("model", "llama3.2:3b")
@@ -199,15 +322,15 @@ def news_chat(body: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
             f"Session ID: {session_id}, News Chat Query: {question}, Model: {model} (logger не доступен)"
         )
 
-    chat_history_for_llm = get_chat_history(session_id)
+    chat_history_for_llm = await get_recent_chat_history(session_id)
 
     try:
         llm_query = f"Что нового в теме '{question}'?"
-        llm_result = process_news_with_llm(llm_query, chat_history_for_llm)
+        llm_result = await process_news_with_llm(llm_query, chat_history_for_llm)
         answer_text = llm_result.get("answer", "")
         answer_sources = llm_result.get("sources", [])
 
-        insert_application_logs(
+        await insert_application_logs(
             session_id, question, answer_text, answer_sources, model
         )
 
@@ -239,9 +362,76 @@ def news_chat(body: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
         )
 
 
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/news-chat-stream")
+async def news_chat_stream(body: Dict[str, Any] = Body(...)) -> StreamingResponse:
+    question = body.get("question")
+    session_id = body.get("session_id") or str(uuid.uuid4())
+    model = body.get("model", "llama3.2:3b")
+
+    if not isinstance(question, str) or not question.strip():
+        raise HTTPException(
+            status_code=422, detail="Field 'question' must be a non-empty string"
+        )
+    if model not in ["llama3.2:3b"]:
+        raise HTTPException(
+            status_code=422, detail="Field 'model' must be 'llama3.2:3b'"
+        )
+
+    if logger:
+        logger.info(
+            f"Session ID: {session_id}, News Chat Stream Query: {question}, Model: {model}"
+        )
+
+    chat_history_for_llm = await get_recent_chat_history(session_id)
+
+    async def event_stream():
+        answer_parts = []
+        answer_sources = []
+        try:
+            llm_query = f"Что нового в теме '{question}'?"
+            async for event, data in stream_news_with_llm(llm_query, chat_history_for_llm):
+                if event == "token":
+                    answer_parts.append(data)
+                    yield sse_event("token", {"token": data})
+                else:
+                    answer_sources = data
+                    yield sse_event("sources", {"sources": answer_sources})
+
+            # Запись в журнал только после завершения генерации
+            answer_text = "".join(answer_parts)
+            await insert_application_logs(
+                session_id, question, answer_text, answer_sources, model
+            )
+            if logger:
+                logger.info(
+                    f"Session ID: {session_id}, News Chat Stream completed: {len(answer_text)} chars, Sources: {len(answer_sources)}"
+                )
+            yield sse_event("done", {"session_id": session_id, "model": model})
+        except Exception as e:
+            if logger:
+                logger.error(
+                    f"Session ID: {session_id}, News Chat Stream error: {str(e)}", exc_info=True
+                )
+            yield sse_event("error", {"detail": f"Error processing news chat: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/chat-history")
-def get_selected_chat_history(session_id: str):
-    chat_history_data = get_chat_history(session_id=session_id)
+async def get_selected_chat_history(
+    session_id: str, limit: int = Query(50, ge=1, le=500), before_id: Optional[int] = None
+):
+    chat_history_data, next_before_id = await get_chat_history(
+        session_id=session_id, limit=limit, before_id=before_id
+    )
     if logger:
         logger.info(
             f"Retrieved chat history for session_id: {session_id}, records: {len(chat_history_data)}"
@@ -250,4 +440,32 @@ def get_selected_chat_history(session_id: str):
         print(
             f"Retrieved chat history for session_id: {session_id} (logger не доступен)"
         )
-    return chat_history_data
+    return {"history": chat_history_data, "next_before_id": next_before_id}
+
+
+@app.get("/ingest-jobs/{job_id}")
+async def ingest_job_status(job_id: str):
+    job = ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@app.get("/stats/ingest-queue")
+async def ingest_queue_stats():
+    return ingest_queue.stats()
+
+
+@app.get("/stats/scraping")
+async def scraping_stats():
+    return get_scraping_stats()
+
+
+@app.get("/stats/answer-cache")
+async def answer_cache_stats():
+    return get_answer_cache().stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,45 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """Асинхронный token bucket: rate токенов в секунду, не больше burst подряд."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class HostRateLimiter:
+    """Отдельный token bucket на каждый хост; лимиты можно задать по хосту."""
+
+    def __init__(self, default_rate: float = 1.0, default_burst: int = 3, host_limits: dict = None):
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self.host_limits = host_limits or {}
+        self._buckets = {}
+
+    def _bucket(self, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, burst = self.host_limits.get(host, (self.default_rate, self.default_burst))
+            bucket = self._buckets[host] = TokenBucket(rate, burst)
+        return bucket
+
+    async def acquire(self, url: str):
+        await self._bucket(urlsplit(url).hostname or "").acquire()
@@ -0,0 +1,125 @@
+import asyncio
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+
+import aiosqlite
+
+logger = logging.getLogger("sqlite_pool")
+
+# WAL позволяет читать во время записи; synchronous=NORMAL в режиме WAL безопасен
+# для целостности БД и не делает fsync на каждый commit
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -32000",  # 32 МБ страничного кэша на соединение
+    "PRAGMA mmap_size = 268435456",  # 256 МБ файла читаются через mmap
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+# Сколько подготовленных выражений sqlite3 держит на соединение
+CACHED_STATEMENTS = 256
+
+
+class ThreadLocalConnectionPool:
+    """Одно открытое соединение sqlite3 на поток для каждого файла БД.
+
+    Соединение создаётся при первом обращении потока и дальше
+    переиспользуется вместе с кэшем подготовленных выражений. Ключ —
+    абсолютный путь, поэтому смена рабочего каталога даёт новую БД.
+    """
+
+    def __init__(self, database: str):
+        self.database = database
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def connection(self) -> sqlite3.Connection:
+        path = os.path.abspath(self.database)
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(path)
+        if conn is None:
+            # check_same_thread=False только ради close() при остановке: работает с соединением один поток
+            conn = sqlite3.connect(path, cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for pragma in SQLITE_PRAGMAS:
+                conn.execute(pragma)
+            connections[path] = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Закрывает соединения всех потоков (после остановки пулов потоков)."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+
+class AsyncConnectionPool:
+    """Пул соединений aiosqlite: задача берёт соединение на время работы и возвращает его.
+
+    Соединения открываются лениво, не больше size одновременно. Перед
+    возвратом в пул незавершённая транзакция откатывается.
+    """
+
+    def __init__(self, database: str, size: int = 4):
+        self.database = database
+        self.size = size
+        self._idle = []
+        self._created = 0
+        self._condition = None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.database, cached_statements=CACHED_STATEMENTS)
+        conn.row_factory = sqlite3.Row
+        for pragma in SQLITE_PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            while not self._idle and self._created >= self.size:
+                await self._condition.wait()
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._created += 1
+        try:
+            if conn is None:
+                conn = await self._connect()
+        except BaseException:
+            async with self._condition:
+                self._created -= 1
+                self._condition.notify()
+            raise
+        try:
+            yield conn
+        finally:
+            try:
+                if conn.in_transaction:
+                    await conn.rollback()
+            except Exception as e:
+                logger.error(f"Соединение {self.database} закрыто после ошибки: {str(e)}")
+                await conn.close()
+                conn = None
+            async with self._condition:
+                if conn is None:
+                    self._created -= 1
+                else:
+                    self._idle.append(conn)
+                self._condition.notify()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        self._created -= len(idle)
+        for conn in idle:
+            await conn.close()
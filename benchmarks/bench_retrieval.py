@@ -0,0 +1,259 @@
+"""Полнота и скорость поиска fetch_news_from_db для каждого типа индекса FAISS.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.bench_retrieval --sizes 10000 100000 --output retrieval.json
+
+Для каждого размера корпуса во временной БД создаются синтетические
+статьи (по одному фрагменту) с векторами из смеси гауссиан размерности
+EMBED_DIM. Запросы — зашумлённые векторы статей корпуса; фиктивная модель
+возвращает их по тексту запроса, так что замеряется весь путь
+fetch_news_from_db: эмбеддинг → FAISS → BM25 → чтение фрагментов из SQLite.
+Эталон — точный поиск по тем же векторам, он считается по частям и не
+требует держать корпус в памяти. На каждый тип индекса отчёт содержит
+время построения, RSS, размер файла индекса, а на каждое
+значение nprobe/ef_search — recall@k, p50/p95/p99 задержки всего пути и
+отдельно поиска в FAISS, QPS при нескольких числах потоков. Корпус в 5M векторов требует около 8 ГБ
+памяти на построение индекса и столько же на диске.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+
+from benchmarks.common import FakeEmbedding, temp_workdir
+from embedding_service import EMBED_DIM, init_embedding_service  # noqa: E402
+
+import faiss_index_factory  # noqa: E402
+from faiss_index_manager import INDEX_FILE, get_index_manager  # noqa: E402
+from news_db_utils import (  # noqa: E402
+    content_hash,
+    decode_embeddings,
+    encode_embedding,
+    fetch_news_from_db,
+    get_db_connection,
+    initialize_database,
+    initialize_faiss_index,
+)
+
+GENERATE_BATCH = 50000
+# Статей в одном кластере синтетического корпуса
+CLUSTER_SIZE = 1000
+
+
+class QueryTableEmbedding(FakeEmbedding):
+    """FakeEmbedding, который для текстов запросов бенчмарка возвращает заранее заданные векторы."""
+
+    vectors: dict = {}
+
+    def embed_text(self, text: str) -> np.ndarray:
+        vector = self.vectors.get(text)
+        return vector if vector is not None else super().embed_text(text)
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса; где нет /proc — пиковый."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def query_text(i: int) -> str:
+    # Вопрос, а не ключевые слова, — fetch_news_from_db не уходит в путь только по BM25;
+    # метка запроса не встречается в текстах корпуса, так что BM25 не меняет выдачу
+    return f"Что известно о событии q{i:06d}?"
+
+
+def generate_corpus(size: int, queries: int, query_noise: float, seed: int) -> np.ndarray:
+    """Пишет статьи и их фрагменты в БД частями; возвращает векторы запросов."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, size // CLUSTER_SIZE), EMBED_DIM), dtype=np.float32)
+    query_sources = np.sort(rng.choice(size, size=min(queries, size), replace=False))
+    query_vectors = np.empty((len(query_sources), EMBED_DIM), dtype=np.float32)
+
+    for start in range(0, size, GENERATE_BATCH):
+        stop = min(size, start + GENERATE_BATCH)
+        assign = rng.integers(0, len(centers), stop - start)
+        vectors = centers[assign] + 0.5 * rng.standard_normal((stop - start, EMBED_DIM), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        in_batch = (query_sources >= start) & (query_sources < stop)
+        noisy = vectors[query_sources[in_batch] - start]
+        noisy = noisy + query_noise * rng.standard_normal(noisy.shape, dtype=np.float32)
+        query_vectors[in_batch] = noisy / np.linalg.norm(noisy, axis=1, keepdims=True)
+
+        ids = range(start + 1, stop + 1)
+        articles = [(f"Статья {db_id}", f"Синтетический текст статьи {db_id} в кластере {cluster}")
+                    for db_id, cluster in zip(ids, assign.tolist())]
+        with get_db_connection() as conn:
+            conn.executemany('''INSERT INTO news (id, title, content, url, content_hash, fetched_at)
+                                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)''',
+                             [(db_id, title, content, f"https://example.org/bench/{db_id}",
+                               content_hash(title, content))
+                              for db_id, (title, content) in zip(ids, articles)])
+            conn.executemany('INSERT INTO news_chunks (id, news_id, chunk_index, text, embedding) VALUES (?, ?, 0, ?, ?)',
+                             [(db_id, db_id, content, encode_embedding(vector))
+                              for db_id, (_, content), vector in zip(ids, articles, vectors)])
+            conn.commit()
+    return query_vectors
+
+
+def exact_top_k(query_vectors: np.ndarray, k: int) -> np.ndarray:
+    """Точный top-k по всем векторам фрагментов в БД; векторы читаются страницами, а не целиком."""
+    best_scores = np.full((len(query_vectors), k), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(query_vectors), k), dtype=np.int64)
+    last_id = 0
+    while True:
+        with get_db_connection() as conn:
+            rows = conn.execute('SELECT id, news_id, embedding FROM news_chunks WHERE id > ? ORDER BY id LIMIT ?',
+                                (last_id, GENERATE_BATCH)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        ids = np.asarray([row['news_id'] for row in rows], dtype=np.int64)
+        vectors = decode_embeddings([row['embedding'] for row in rows])
+        scores = np.concatenate([best_scores, query_vectors @ vectors.T], axis=1)
+        candidates = np.concatenate([best_ids, np.broadcast_to(ids, (len(query_vectors), len(ids)))], axis=1)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(candidates, top, axis=1)
+    return best_ids
+
+
+def percentiles(latencies: list) -> dict:
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "mean": float(np.mean(latencies))}
+
+
+def measure(queries: list, query_vectors: np.ndarray, truth: np.ndarray, k: int, threads: list,
+            search_kwargs: dict) -> dict:
+    latencies = []
+    hits = 0
+    for i, text in enumerate(queries):
+        started = time.perf_counter()
+        results = fetch_news_from_db(text, top_k=k, **search_kwargs)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len({news["id"] for news in results[:k]} & set(truth[i].tolist()))
+
+    # Отдельно только FAISS: в полном пути его время теряется на фоне эмбеддинга и SQLite
+    manager = get_index_manager()
+    index_latencies = []
+    for vector in query_vectors:
+        started = time.perf_counter()
+        manager.search(vector, k, **search_kwargs)
+        index_latencies.append((time.perf_counter() - started) * 1000)
+
+    qps = {}
+    for workers in threads:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            started = time.perf_counter()
+            list(pool.map(lambda text: fetch_news_from_db(text, top_k=k, **search_kwargs), queries))
+            qps[str(workers)] = len(queries) / (time.perf_counter() - started)
+
+    return {
+        "recall_at_k": hits / (len(queries) * k),
+        "latency_ms": percentiles(latencies),
+        "index_latency_ms": percentiles(index_latencies),
+        "qps": qps,
+    }
+
+
+def search_settings(spec: dict, nprobe: list, ef_search: list) -> list:
+    """Значения точности, которые стоит перебрать для индекса: None — значение самого индекса."""
+    if spec["nlist"] is not None:
+        return [{}] + [{"nprobe": value} for value in nprobe if value != spec["nprobe"]]
+    if spec["ef_search"] is not None:
+        return [{}] + [{"ef_search": value} for value in ef_search if value != spec["ef_search"]]
+    return [{}]
+
+
+def run_size(size: int, embedder: QueryTableEmbedding, args) -> dict:
+    with temp_workdir():
+        initialize_database()
+        started = time.perf_counter()
+        query_vectors = generate_corpus(size, args.queries, args.query_noise, args.seed)
+        report = {"size": size, "generate_seconds": time.perf_counter() - started, "indexes": []}
+        truth = exact_top_k(query_vectors, args.k)
+        queries = [query_text(i) for i in range(len(query_vectors))]
+        embedder.vectors = dict(zip(queries, query_vectors))
+
+        for index_type in args.index_types:
+            faiss_index_factory.INDEX_TYPE = index_type
+            rss_before = rss_mb()
+            started = time.perf_counter()
+            initialize_faiss_index()
+            build_seconds = time.perf_counter() - started
+            spec = faiss_index_factory.choose_index_spec(size)
+            entry = {
+                "index_type": index_type,
+                "description": spec["description"],
+                "build_seconds": build_seconds,
+                "rss_mb": rss_mb(),
+                "rss_delta_mb": rss_mb() - rss_before,
+                "index_file_mb": os.path.getsize(INDEX_FILE) / 2 ** 20,
+                "runs": [],
+            }
+            for search_kwargs in search_settings(spec, args.nprobe, args.ef_search):
+                run = measure(queries, query_vectors, truth, args.k, args.threads, search_kwargs)
+                entry["runs"].append({"params": search_kwargs, **run})
+                logging.warning(f"{size} {spec['description']} {search_kwargs}: recall@{args.k} "
+                                f"{run['recall_at_k']:.3f}, p50 {run['latency_ms']['p50']:.2f} мс")
+            report["indexes"].append(entry)
+        faiss_index_factory.INDEX_TYPE = faiss_index_factory.INDEX_AUTO
+        return report
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--index-types", nargs="+", default=list(faiss_index_factory.INDEX_TYPES),
+                        choices=faiss_index_factory.INDEX_TYPES)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 128])
+    parser.add_argument("--query-noise", type=float, default=0.05,
+                        help="Стандартное отклонение шума, добавляемого к вектору статьи в запросе")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Файл для JSON-отчёта (по умолчанию — stdout)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    embedder = QueryTableEmbedding()
+    init_embedding_service(embedder, max_batch_size=512)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "faiss_version": faiss.__version__,
+        "dim": EMBED_DIM,
+        "k": args.k,
+        "queries": args.queries,
+        "sizes": [run_size(size, embedder, args) for size in args.sizes],
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
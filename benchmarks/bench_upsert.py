@@ -0,0 +1,115 @@
+"""Сравнение пакетного upsert в save_to_database с прежним построчным циклом.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.bench_upsert --articles 10000
+
+Оба варианта работают в отдельной временной БД с фиктивной моделью
+эмбеддингов, одинаково режут статьи на фрагменты и одинаково обновляют
+news_chunks и FAISS (метки — id фрагментов), так что разница — это
+запись строк news в SQLite. Прежний цикл запускается без индекса по
+title, как в старой схеме.
+Сценарии: вставка articles новых статей, затем повторная загрузка, в
+которой половина статей изменена, а половина новая.
+"""
+import argparse
+import json
+import logging
+import time
+
+from benchmarks.common import install_fake_embedder, temp_workdir
+
+from news_db_utils import (  # noqa: E402
+    chunk_articles,
+    content_hash,
+    get_db_connection,
+    initialize_database,
+    replace_chunks,
+    save_to_database,
+    update_faiss_index,
+)
+
+
+def legacy_save_to_database(news_data):
+    """Построчный цикл записи строк news до перехода на пакетный upsert; фрагменты и FAISS — как в save_to_database."""
+    chunks, vectors = chunk_articles([(news["title"], news["content"]) for news in news_data])
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        news_ids = []
+        for news in news_data:
+            title, content, url = news["title"], news["content"], news["url"]
+            digest = content_hash(title, content)
+            existing_by_title = cursor.execute("SELECT id, url FROM news WHERE title = ?", (title,)).fetchone()
+            if existing_by_title and existing_by_title["url"] == url:
+                cursor.execute("UPDATE news SET fetched_at = CURRENT_TIMESTAMP, content_hash = ?, content = ?, embedding = NULL WHERE id = ?",
+                               (digest, content, existing_by_title["id"]))
+                news_ids.append(existing_by_title["id"])
+                continue
+            existing_by_url = cursor.execute("SELECT id FROM news WHERE url = ?", (url,)).fetchone()
+            if existing_by_url:
+                cursor.execute("UPDATE news SET fetched_at = CURRENT_TIMESTAMP, content_hash = ?, title = ?, content = ?, embedding = NULL WHERE url = ?",
+                               (digest, title, content, url))
+                news_ids.append(existing_by_url["id"])
+            elif existing_by_title:
+                cursor.execute("UPDATE news SET fetched_at = CURRENT_TIMESTAMP, content_hash = ?, content = ?, url = ?, embedding = NULL WHERE id = ?",
+                               (digest, content, url, existing_by_title["id"]))
+                news_ids.append(existing_by_title["id"])
+            else:
+                cursor.execute("INSERT INTO news (title, content, url, fetched_at, content_hash) VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?)",
+                               (title, content, url, digest))
+                news_ids.append(cursor.execute("SELECT id FROM news WHERE url = ?", (url,)).fetchone()["id"])
+        chunk_ids, removed_chunk_ids = replace_chunks(conn, news_ids, chunks, vectors)
+        conn.commit()
+    update_faiss_index(vectors, chunk_ids, removed_chunk_ids)
+
+
+def make_articles(start: int, count: int, revision: int = 0) -> list:
+    return [
+        {
+            "title": f"Новость {i}",
+            "content": f"Текст новости {i}, редакция {revision}. " * 20,
+            "url": f"https://example.org/news/{i}",
+            "date": "",
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def run_variant(save, articles: int, drop_title_index: bool) -> dict:
+    with temp_workdir():
+        initialize_database()
+        if drop_title_index:
+            with get_db_connection() as conn:
+                conn.execute("DROP INDEX IF EXISTS idx_news_title")
+        results = {}
+        started = time.perf_counter()
+        save(make_articles(0, articles))
+        results["insert_seconds"] = time.perf_counter() - started
+        # Вторая загрузка: половина статей изменена, половина новая
+        started = time.perf_counter()
+        save(make_articles(articles // 2, articles, revision=1))
+        results["upsert_seconds"] = time.perf_counter() - started
+        with get_db_connection() as conn:
+            results["rows"] = conn.execute("SELECT COUNT(*) FROM news").fetchone()[0]
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articles", type=int, default=10000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    install_fake_embedder()
+
+    report = {
+        "articles": args.articles,
+        "legacy_loop": run_variant(legacy_save_to_database, args.articles, drop_title_index=True),
+        "bulk_upsert": run_variant(save_to_database, args.articles, drop_title_index=False),
+    }
+    for phase in ("insert_seconds", "upsert_seconds"):
+        report[f"speedup_{phase.split('_')[0]}"] = report["legacy_loop"][phase] / report["bulk_upsert"][phase]
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Общие помощники бенчмарков: импорт backend, фиктивная модель эмбеддингов, временный каталог."""
+import contextlib
+import hashlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from embedding_service import EMBED_DIM, init_embedding_service  # noqa: E402
+from faiss_index_manager import reset_index_manager  # noqa: E402
+
+
+class FakeEmbedding(BaseEmbedding):
+    """Детерминированная замена HuggingFaceEmbedding: вектор зависит только от текста.
+
+    Не требует загрузки модели, поэтому бенчмарки измеряют хранилище и
+    индекс, а не нейросеть. Это BaseEmbedding, так что её можно
+    назначить и в Settings.embed_model.
+    """
+
+    dim: int = EMBED_DIM
+
+    def embed_text(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim, dtype=np.float32)
+
+    def get_text_embedding_batch(self, texts, **kwargs):
+        return np.stack([self.embed_text(text) for text in texts])
+
+    def _get_text_embedding(self, text: str):
+        return self.embed_text(text).tolist()
+
+    def _get_query_embedding(self, query: str):
+        return self.embed_text(query).tolist()
+
+    async def _aget_query_embedding(self, query: str):
+        return self._get_query_embedding(query)
+
+
+def install_fake_embedder():
+    """Подключает FakeEmbedding как модель общего сервиса эмбеддингов."""
+    return init_embedding_service(FakeEmbedding(), max_batch_size=512)
+
+
+@contextlib.contextmanager
+def temp_workdir():
+    """Выполняет блок во временном каталоге: backend пишет news_database.db и индекс в cwd."""
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as path:
+        os.chdir(path)
+        reset_index_manager()
+        try:
+            yield path
+        finally:
+            os.chdir(previous)
+            reset_index_manager()
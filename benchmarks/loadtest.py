@@ -0,0 +1,209 @@
+"""Нагрузочный тест backend с локальными заглушками Ollama, NewsAPI и RIA.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.loadtest --concurrency 1 8 32 --duration 30 --output load.json
+
+Поднимает заглушки (benchmarks.stub_servers) и backend (benchmarks.serve_app)
+в отдельных процессах во временном каталоге, прогревает базу поиском по
+всем запросам с "wait": true, затем для каждого эндпоинта и каждого уровня
+параллелизма в течение duration секунд шлёт запросы из concurrency
+клиентов. Отчёт (JSON): число запросов, доля ошибок и коды ответов,
+пропускная способность, p50/p95/p99 задержки успешных запросов. С
+--app-url нагрузка идёт на уже запущенный backend — его нужно запустить с
+переменными окружения, которые печатает benchmarks.stub_servers.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+import numpy as np
+
+from benchmarks.common import BACKEND_DIR
+from benchmarks.stub_servers import WORDS, add_stub_arguments, stub_environment
+
+ENDPOINTS = ("search-ria", "search-newsapi", "news-chat")
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+STARTUP_TIMEOUT = 300
+
+logger = logging.getLogger("loadtest")
+
+
+def make_queries(count: int) -> list:
+    return [f"{WORDS[i % len(WORDS)]} {WORDS[(i * 7 + 3) % len(WORDS)]}" for i in range(count)]
+
+
+def start_process(args: list, env: dict, cwd: str, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable, "-m", *args], cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, process: subprocess.Popen = None):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Процесс завершился с кодом {process.returncode} до готовности {url}")
+        try:
+            response = await client.get(url, timeout=5)
+            if response.status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"{url} не ответил за {STARTUP_TIMEOUT} с")
+
+
+async def warm_up(client: httpx.AsyncClient, app_url: str, queries: list):
+    """Загружает статьи по всем запросам, чтобы /news-chat было из чего отвечать."""
+    for query in queries:
+        for endpoint in ("search-ria", "search-newsapi"):
+            response = await client.post(f"{app_url}/{endpoint}", json={"question": query, "wait": True})
+            if response.status_code != 200:
+                logger.warning(f"Прогрев {endpoint} '{query}': HTTP {response.status_code}")
+
+
+async def run_level(client: httpx.AsyncClient, app_url: str, endpoint: str, queries: list,
+                    concurrency: int, duration: float) -> dict:
+    latencies = []
+    statuses = {}
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def worker(number: int):
+        nonlocal errors
+        # У каждого клиента своя сессия: история чата растёт, как у настоящего пользователя
+        session_id = str(uuid.uuid4())
+        i = number
+        while time.monotonic() < deadline:
+            query = queries[i % len(queries)]
+            i += concurrency
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{app_url}/{endpoint}",
+                                             json={"question": query, "session_id": session_id})
+                status = str(response.status_code)
+                if response.status_code == 200:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+                errors += 1
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    elapsed = time.monotonic() - started
+    total = len(latencies) + errors
+    report = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests": total,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "status_codes": statuses,
+        "throughput_rps": len(latencies) / elapsed,
+    }
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        report["latency_ms"] = {"p50": p50, "p95": p95, "p99": p99, "max": max(latencies)}
+    return report
+
+
+async def run(args) -> dict:
+    processes = []
+    workdir = tempfile.mkdtemp(prefix="rag-load-")
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [REPO_DIR, BACKEND_DIR, os.environ.get("PYTHONPATH")]))}
+    app_url = args.app_url
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 4)
+    try:
+        async with httpx.AsyncClient(timeout=args.request_timeout, limits=limits) as client:
+            if app_url is None:
+                stub_args = ["benchmarks.stub_servers"] + [
+                    f"--{name.replace('_', '-')}={getattr(args, name)}"
+                    for name in ("ollama_port", "newsapi_port", "ria_port", "token_rate", "first_token_ms",
+                                 "answer_tokens", "article_latency_ms", "article_words")
+                ]
+                processes.append(start_process(stub_args, env, REPO_DIR, os.path.join(workdir, "stubs.log")))
+                await wait_ready(client, f"http://127.0.0.1:{args.ollama_port}/api/tags", processes[-1])
+
+                app_args = ["benchmarks.serve_app", f"--port={args.app_port}"]
+                if args.fake_embedder:
+                    app_args.append("--fake-embedder")
+                processes.append(start_process(app_args, {**env, **stub_environment(args)}, workdir,
+                                               os.path.join(workdir, "app.log")))
+                app_url = f"http://127.0.0.1:{args.app_port}"
+                await wait_ready(client, f"{app_url}/stats/ingest-queue", processes[-1])
+                logger.warning(f"Backend и заглушки запущены, журналы в {workdir}")
+
+            queries = make_queries(args.queries)
+            started = time.monotonic()
+            if args.warmup:
+                await warm_up(client, app_url, queries)
+            report = {
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "app_url": app_url,
+                "stubs": None if args.app_url else {
+                    "token_rate": args.token_rate,
+                    "first_token_ms": args.first_token_ms,
+                    "answer_tokens": args.answer_tokens,
+                    "article_latency_ms": args.article_latency_ms,
+                },
+                "fake_embedder": args.fake_embedder,
+                "queries": len(queries),
+                "warmup_seconds": time.monotonic() - started,
+                "runs": [],
+            }
+            for endpoint in args.endpoints:
+                for concurrency in args.concurrency:
+                    result = await run_level(client, app_url, endpoint, queries, concurrency, args.duration)
+                    report["runs"].append(result)
+                    logger.warning(f"{endpoint} x{concurrency}: {result['throughput_rps']:.1f} rps, "
+                                   f"ошибок {result['error_rate']:.1%}, "
+                                   f"p95 {result.get('latency_ms', {}).get('p95', float('nan')):.0f} мс")
+            return report
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=30.0, help="Секунд нагрузки на каждый уровень")
+    parser.add_argument("--queries", type=int, default=20, help="Сколько разных вопросов задают клиенты")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--app-url", help="Нагружать уже запущенный backend вместо запуска своего")
+    parser.add_argument("--app-port", type=int, default=18000)
+    parser.add_argument("--fake-embedder", action="store_true",
+                        help="Запустить backend с FakeEmbedding вместо модели эмбеддингов")
+    parser.add_argument("--output", help="Файл для JSON-отчёта (по умолчанию — stdout)")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    output = json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Запуск backend (rag:app) для нагрузочного теста.
+
+    python -m benchmarks.serve_app --port 8000 [--fake-embedder]
+
+С --fake-embedder вместо all-MiniLM-L6-v2 подключается FakeEmbedding из
+benchmarks.common: модель не скачивается, но и время эмбеддинга в
+замерах тогда не учитывается. БД и индекс пишутся в текущий каталог.
+"""
+import argparse
+
+import uvicorn
+
+from benchmarks.common import install_fake_embedder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fake-embedder", action="store_true")
+    args = parser.parse_args()
+    if args.fake_embedder:
+        install_fake_embedder()
+    # Импорт после подмены модели: setup_settings возьмёт уже созданный сервис эмбеддингов
+    from rag import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
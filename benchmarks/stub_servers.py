@@ -0,0 +1,203 @@
+"""Локальные заглушки Ollama, NewsAPI и RIA для нагрузочного теста.
+
+Запуск отдельно (например, чтобы поднять backend без внешних сервисов):
+
+    python -m benchmarks.stub_servers --ollama-port 11500 --newsapi-port 11501 --ria-port 11502
+
+и backend с переменными окружения
+
+    OLLAMA_BASE_URL=http://127.0.0.1:11500
+    NEWSAPI_URL=http://127.0.0.1:11501/v2/everything
+    RIA_SEARCH_URL=http://127.0.0.1:11502/search/
+
+Ответы детерминированы: статьи и их тексты зависят только от запроса и
+номера результата, поэтому повторный запрос видит те же URL, как и у
+настоящих сервисов. Ollama отвечает на /api/chat и /api/generate
+(потоково и целиком) с заданной скоростью токенов.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from datetime import datetime, timezone
+from html import escape
+from urllib.parse import quote
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+
+WORDS = (
+    "правительство экономика рынок бюджет регион компания выборы министр банк нефть газ "
+    "технологии искусственный интеллект спорт погода транспорт медицина образование наука "
+    "культура суд закон налог инфляция курс рубль экспорт импорт переговоры саммит"
+).split()
+SEARCH_RESULTS = 20
+
+
+def canned_text(seed: str, words: int) -> str:
+    """Детерминированный «текст новости» из WORDS, разбитый на предложения."""
+    rng = random.Random(hashlib.sha256(seed.encode("utf-8")).digest())
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(8, 16))
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        words -= length
+    return " ".join(sentences)
+
+
+def ollama_app(token_rate: float, first_token_ms: float, answer_tokens: int) -> FastAPI:
+    """Ollama-совместимый /api/chat и /api/generate: answer_tokens токенов со скоростью token_rate в секунду."""
+    app = FastAPI()
+
+    def tokens_for(prompt: str) -> list:
+        return [word + " " for word in canned_text(prompt, answer_tokens).split()]
+
+    def final_fields(model: str, prompt: str, tokens: list, started: float) -> dict:
+        return {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.monotonic() - started) * 1e9),
+            "prompt_eval_count": len(prompt.split()),
+            "eval_count": len(tokens),
+        }
+
+    async def respond(body: dict, prompt: str, wrap):
+        started = time.monotonic()
+        model = body.get("model", "llama3.2:3b")
+        tokens = tokens_for(prompt)
+        if not body.get("stream", True):
+            await asyncio.sleep(first_token_ms / 1000 + len(tokens) / token_rate)
+            return JSONResponse({**final_fields(model, prompt, tokens, started), **wrap("".join(tokens))})
+
+        async def stream():
+            await asyncio.sleep(first_token_ms / 1000)
+            for token in tokens:
+                yield json.dumps({"model": model, "created_at": datetime.now(timezone.utc).isoformat(),
+                                  "done": False, **wrap(token)}, ensure_ascii=False) + "\n"
+                await asyncio.sleep(1 / token_rate)
+            yield json.dumps({**final_fields(model, prompt, tokens, started), **wrap("")}) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        prompt = " ".join(message.get("content") or "" for message in body.get("messages", []))
+        return await respond(body, prompt, lambda text: {"message": {"role": "assistant", "content": text}})
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        return await respond(body, body.get("prompt", ""), lambda text: {"response": text})
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "llama3.2:3b", "model": "llama3.2:3b"}]}
+
+    return app
+
+
+def newsapi_app(base_url: str) -> FastAPI:
+    """Заглушка NewsAPI /v2/everything с тем же форматом ответа."""
+    app = FastAPI()
+
+    @app.get("/v2/everything")
+    async def everything(q: str = "", pageSize: int = 20):
+        articles = []
+        for i in range(min(pageSize, 100)):
+            seed = f"newsapi:{q}:{i}"
+            articles.append({
+                "source": {"id": None, "name": "Stub News"},
+                "author": "Stub",
+                "title": f"{q}: новость {i + 1}",
+                "description": f"{q}. {canned_text(seed + ':description', 40)}",
+                "url": f"{base_url}/articles/{quote(q)}/{i}",
+                "urlToImage": None,
+                "publishedAt": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "content": f"{q}. {canned_text(seed, 30)} [+{1000 + i} chars]",
+            })
+        return {"status": "ok", "totalResults": len(articles), "articles": articles}
+
+    return app
+
+
+def ria_app(base_url: str, article_latency_ms: float, article_words: int) -> FastAPI:
+    """Заглушка поиска ria.ru и страниц статей с разметкой, которую разбирает pars."""
+    app = FastAPI()
+
+    @app.get("/search/", response_class=HTMLResponse)
+    async def search(query: str = ""):
+        items = "".join(
+            f'<div class="list-item"><a class="list-item__title" href="{base_url}/article/{quote(query)}/{i}.html">'
+            f"{escape(query)}: событие {i + 1}</a></div>"
+            for i in range(SEARCH_RESULTS)
+        )
+        return f"<html><body>{items}</body></html>"
+
+    @app.get("/article/{query}/{number}.html", response_class=HTMLResponse)
+    async def article(query: str, number: int):
+        await asyncio.sleep(article_latency_ms / 1000)
+        seed = f"ria:{query}:{number}"
+        paragraphs = "".join(f"<p>{escape(query)}. {canned_text(f'{seed}:{i}', article_words // 5)}</p>"
+                             for i in range(5))
+        description = escape(canned_text(seed + ":description", 30))
+        return (f'<html><head><meta name="description" content="{description}"></head>'
+                f'<body><div class="article__body">{paragraphs}</div></body></html>')
+
+    return app
+
+
+async def serve(apps: dict, host: str = "127.0.0.1"):
+    """Запускает приложения {port: app} в одном event loop до отмены."""
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        for port, app in apps.items()
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--ollama-port", type=int, default=11500)
+    parser.add_argument("--newsapi-port", type=int, default=11501)
+    parser.add_argument("--ria-port", type=int, default=11502)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Токенов в секунду у заглушки Ollama")
+    parser.add_argument("--first-token-ms", type=float, default=200.0, help="Задержка до первого токена")
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--article-latency-ms", type=float, default=50.0, help="Задержка ответа страницы статьи RIA")
+    parser.add_argument("--article-words", type=int, default=400)
+
+
+def stub_apps(args) -> dict:
+    return {
+        args.ollama_port: ollama_app(args.token_rate, args.first_token_ms, args.answer_tokens),
+        args.newsapi_port: newsapi_app(f"http://127.0.0.1:{args.newsapi_port}"),
+        args.ria_port: ria_app(f"http://127.0.0.1:{args.ria_port}", args.article_latency_ms, args.article_words),
+    }
+
+
+def stub_environment(args) -> dict:
+    """Переменные окружения, направляющие backend на заглушки."""
+    return {
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{args.ollama_port}",
+        "NEWSAPI_URL": f"http://127.0.0.1:{args.newsapi_port}/v2/everything",
+        "RIA_SEARCH_URL": f"http://127.0.0.1:{args.ria_port}/search/",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    for name, value in stub_environment(args).items():
+        print(f"{name}={value}")
+    asyncio.run(serve(stub_apps(args)))
+
+
+if __name__ == "__main__":
+    main()
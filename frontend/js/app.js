@@ -8,6 +8,7 @@ const app = createApp({
         const chats = ref([]);
         const currentChatId = ref(null);
         const isLoading = ref(false);
+        const isStreaming = ref(false);
         const isSidebarExpanded = ref(false);
 
         // Get the current chat
@@ -87,6 +88,33 @@ const app = createApp({
             currentChatId.value = chatId;
         };
 
+        // Read a text/event-stream response and call onEvent(event, data) per event
+        const readEventStream = async (response, onEvent) => {
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let event = 'message';
+                    let data = '';
+                    for (const line of rawEvent.split('\n')) {
+                        if (line.startsWith('event:')) event = line.slice(6).trim();
+                        else if (line.startsWith('data:')) data += line.slice(5).trim();
+                    }
+                    if (data) onEvent(event, JSON.parse(data));
+                }
+            }
+        };
+
         // Send a message
         const sendMessage = async (text) => {
             if (!text.trim() || !currentChatId.value) return;
@@ -115,9 +143,12 @@ const app = createApp({
             // Show loading state
             isLoading.value = true;
 
+            // Bot message being streamed; on error it is replaced instead of adding a second one
+            let botMessage = null;
+
             try {
-                // Send request to API
-                const response = await fetch('http://localhost:8000/news-chat', {
+                // Send request to the streaming API (Server-Sent Events)
+                const response = await fetch('http://localhost:8000/news-chat-stream', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json'
@@ -129,39 +160,52 @@ const app = createApp({
                     })
                 });
 
-                if (!response.ok) {
+                if (!response.ok || !response.body) {
                     throw new Error('API request failed');
                 }
 
-                const data = await response.json();
-                console.log('API response:', data);
-
-                // Add bot message
-                const botMessage = {
+                // Add bot message and fill it in as tokens arrive
+                chat.messages.push({
                     id: Date.now().toString(),
                     sender: 'bot',
-                    text: data.answer,
-                    sources: data.sources || [],
+                    text: '',
+                    sources: [],
                     timestamp: new Date().toISOString()
-                };
+                });
+                botMessage = chat.messages[chat.messages.length - 1];
+
+                await readEventStream(response, (event, data) => {
+                    if (event === 'token') {
+                        isStreaming.value = true;
+                        botMessage.text += data.token;
+                    } else if (event === 'sources') {
+                        botMessage.sources = data.sources || [];
+                    } else if (event === 'error') {
+                        throw new Error(data.detail);
+                    }
+                });
 
-                chat.messages.push(botMessage);
                 saveChatsToLocalStorage();
             } catch (error) {
                 console.error('Error sending message:', error);
 
-                // Add error message
-                const errorMessage = {
-                    id: Date.now().toString(),
-                    sender: 'bot',
-                    text: 'Sorry, there was an error processing your request. Please try again.',
-                    timestamp: new Date().toISOString()
-                };
-
-                chat.messages.push(errorMessage);
+                const errorText = 'Sorry, there was an error processing your request. Please try again.';
+                if (botMessage) {
+                    // Replace the empty or partial streamed answer with the error
+                    botMessage.text = errorText;
+                    botMessage.sources = [];
+                } else {
+                    chat.messages.push({
+                        id: Date.now().toString(),
+                        sender: 'bot',
+                        text: errorText,
+                        timestamp: new Date().toISOString()
+                    });
+                }
                 saveChatsToLocalStorage();
             } finally {
                 isLoading.value = false;
+                isStreaming.value = false;
             }
         };
 
@@ -176,6 +220,7 @@ const app = createApp({
             currentChat,
             messages,
             isLoading,
+            isStreaming,
             isSidebarExpanded,
             createNewChat,
             deleteChat,
@@ -203,7 +248,7 @@ const app = createApp({
                         :key="message.id" 
                         :message="message" 
                     />
-                    <div v-if="isLoading" class="loading-indicator">
+                    <div v-if="isLoading && !isStreaming" class="loading-indicator">
                         <div class="typing-indicator">
                             <span></span>
                             <span></span>
@@ -4,11 +4,15 @@ import uuid
 from datetime import datetime
 import re
 import json
+import time
 from streamlit.components.v1 import html
 
 # --- Configuration ---
 BACKEND_URL = "http://127.0.0.1:8000"
 DEFAULT_MODEL = "llama3.2:3b"
+# How long to wait for background ingestion before answering from known news
+INGEST_POLL_TIMEOUT = 60
+INGEST_POLL_INTERVAL = 1.0
 SAMPLE_QUESTIONS = [
     "Какие главные новости за сегодня?",
     "Что происходит в экономике?",
@@ -48,6 +52,37 @@ def post_to_backend(endpoint: str, data: dict, params: dict = None):
         return None
 
 
+def wait_for_ingest_job(job_id: str):
+    """Poll the ingestion job until it finishes or INGEST_POLL_TIMEOUT passes."""
+    deadline = time.monotonic() + INGEST_POLL_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            response = requests.get(f"{BACKEND_URL}/ingest-jobs/{job_id}", timeout=10)
+            response.raise_for_status()
+            if response.json()["status"] in ("done", "failed"):
+                return
+        except Exception:
+            return
+        time.sleep(INGEST_POLL_INTERVAL)
+
+
+def stream_from_backend(endpoint: str, data: dict):
+    """Stream Server-Sent Events from the backend as (event, data) pairs."""
+    with requests.post(
+        f"{BACKEND_URL}{endpoint}", json=data, stream=True, timeout=60
+    ) as response:
+        response.raise_for_status()
+        event, payload = "message", ""
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                payload += line[len("data:"):].strip()
+            elif not line and payload:
+                yield event, json.loads(payload)
+                event, payload = "message", ""
+
+
 def create_new_chat():
     """Create a new chat with unique IDs and default settings."""
     frontend_chat_id = str(uuid.uuid4())
@@ -108,27 +143,6 @@ def handle_user_input(user_input, news_source):
             if not news_data:
                 raise ValueError("Новости не найдены")
 
-            # Get AI response
-            chat_response = post_to_backend("/news-chat", search_payload)
-
-            if chat_response:
-                answer = format_message(
-                    clean_source_markers(chat_response.get("answer", ""))
-                )
-                sources = chat_response.get("sources", [])
-
-                current_chat["messages"].append(
-                    {
-                        "id": str(uuid.uuid4()),
-                        "role": "assistant",
-                        "content": answer,
-                        "sources": sources,
-                        "timestamp": datetime.now().strftime("%H:%M"),
-                    }
-                )
-            else:
-                raise ValueError("Ошибка генерации ответа")
-
         except Exception as e:
             current_chat["messages"].append(
                 {
@@ -138,6 +152,49 @@ def handle_user_input(user_input, news_source):
                     "timestamp": datetime.now().strftime("%H:%M"),
                 }
             )
+            return
+
+    if news_data.get("job_status") in ("queued", "running"):
+        with st.spinner("📥 Загружаем свежие статьи..."):
+            wait_for_ingest_job(news_data["job_id"])
+
+    # Stream AI response token by token
+    try:
+        placeholder = st.empty()
+        answer = ""
+        sources = []
+        for event, payload in stream_from_backend("/news-chat-stream", search_payload):
+            if event == "token":
+                answer += payload["token"]
+                placeholder.markdown(answer + "▌")
+            elif event == "sources":
+                sources = payload.get("sources", [])
+            elif event == "error":
+                raise ValueError(payload.get("detail", "Ошибка генерации ответа"))
+        placeholder.empty()
+
+        if not answer:
+            raise ValueError("Ошибка генерации ответа")
+
+        current_chat["messages"].append(
+            {
+                "id": str(uuid.uuid4()),
+                "role": "assistant",
+                "content": format_message(clean_source_markers(answer)),
+                "sources": sources,
+                "timestamp": datetime.now().strftime("%H:%M"),
+            }
+        )
+
+    except Exception as e:
+        current_chat["messages"].append(
+            {
+                "id": str(uuid.uuid4()),
+                "role": "assistant",
+                "content": f"⚠️ Ошибка: {str(e)}",
+                "timestamp": datetime.now().strftime("%H:%M"),
+            }
+        )
 
 
 def delete_chat_confirmation(chat_id):
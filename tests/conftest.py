@@ -0,0 +1,23 @@
+"""Общие фикстуры: backend импортируется как в benchmarks, вместо модели эмбеддингов — FakeEmbedding."""
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+from benchmarks.common import install_fake_embedder  # noqa: E402
+from faiss_index_manager import reset_index_manager  # noqa: E402
+
+install_fake_embedder()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Пустой рабочий каталог: backend пишет БД и индекс FAISS в cwd."""
+    monkeypatch.chdir(tmp_path)
+    reset_index_manager()
+    yield tmp_path
+    reset_index_manager()
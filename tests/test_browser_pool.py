@@ -0,0 +1,117 @@
+"""BrowserPool с драйвером-заглушкой, который загружает страницы с локального http.server."""
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+from browser_pool import BrowserPool
+
+ARTICLE_PAGE = '<html><body><div class="article__body"><p>Текст статьи</p></div></body></html>'
+
+
+class StaticHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/crash"):
+            self.send_error(500)
+            return
+        body = ARTICLE_PAGE.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def static_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StaticHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+class HttpDriver:
+    """Минимальный WebDriver: get() по HTTP, find_element() по имени класса в разметке."""
+
+    def __init__(self):
+        self.page_source = ""
+        self.quit_called = False
+
+    def set_page_load_timeout(self, timeout):
+        self.timeout = timeout
+
+    def get(self, url):
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                self.page_source = response.read().decode("utf-8")
+        except urllib.error.URLError as e:
+            # Как у Chrome: ошибка загрузки страницы — WebDriverException
+            raise WebDriverException(str(e))
+
+    def find_element(self, by, value):
+        if "article" not in self.page_source:
+            raise NoSuchElementException(value)
+        return object()
+
+    def quit(self):
+        self.quit_called = True
+
+
+def make_pool(drivers, **kwargs):
+    def factory():
+        driver = HttpDriver()
+        drivers.append(driver)
+        return driver
+    return BrowserPool(driver_factory=factory, wait_timeout=1, **kwargs)
+
+
+def test_checkout_returns_driver_to_pool(static_server):
+    drivers = []
+    pool = make_pool(drivers, size=2)
+    assert "Текст статьи" in pool.fetch_page_source(f"{static_server}/a")
+    assert "Текст статьи" in pool.fetch_page_source(f"{static_server}/b")
+    stats = pool.stats()
+    assert len(drivers) == 1
+    assert (stats["created"], stats["pages_served"], stats["idle"], stats["in_use"]) == (1, 2, 1, 0)
+    pool.close()
+    assert drivers[0].quit_called
+
+
+def test_driver_recycled_after_max_pages(static_server):
+    drivers = []
+    pool = make_pool(drivers, size=1, max_pages=2)
+    for i in range(3):
+        pool.fetch_page_source(f"{static_server}/{i}")
+    stats = pool.stats()
+    assert len(drivers) == 2
+    assert drivers[0].quit_called and not drivers[1].quit_called
+    assert (stats["created"], stats["recycled"], stats["alive"]) == (2, 1, 1)
+
+
+def test_crashed_driver_is_discarded(static_server):
+    drivers = []
+    pool = make_pool(drivers, size=1)
+    with pytest.raises(WebDriverException):
+        pool.fetch_page_source(f"{static_server}/crash")
+    assert drivers[0].quit_called
+    assert "Текст статьи" in pool.fetch_page_source(f"{static_server}/ok")
+    stats = pool.stats()
+    assert (stats["created"], stats["crashed"], stats["alive"]) == (2, 1, 1)
+
+
+def test_checkout_times_out_when_pool_is_busy(static_server):
+    pool = make_pool([], size=1, checkout_timeout=0.1)
+    with pool.checkout():
+        with pytest.raises(TimeoutError):
+            with pool.checkout():
+                pass
+    # Слот освобождён: браузер снова выдаётся
+    assert "Текст статьи" in pool.fetch_page_source(f"{static_server}/after")
@@ -0,0 +1,71 @@
+"""Переход на фрагменты: старт сервера не пересчитывает эмбеддинги, поиск идёт по векторам целых статей."""
+import json
+
+import faiss
+
+from chunking import chunk_embedding_text, split_article
+from embedding_service import EMBED_DIM, get_embedding_service
+from faiss_index_manager import (
+    ARTICLE_LABELS,
+    CHUNK_LABELS,
+    INDEX_FILE,
+    LEGACY_MAPPING_FILE,
+    get_index_manager,
+    reset_index_manager,
+)
+from news_db_utils import (
+    CHUNKS_VERSION,
+    embedding_text,
+    encode_embedding,
+    fetch_news_from_db,
+    get_db_connection,
+    initialize_database,
+    migrate_to_chunks,
+)
+
+ARTICLES = [(f"Заголовок {i}", f"Текст статьи номер {i} о событии {i}", f"https://example.org/{i}") for i in range(1, 6)]
+
+
+def make_legacy_store():
+    """Хранилище исходной версии: векторы целых статей в news.embedding, позиционный индекс и faiss_to_db.json."""
+    initialize_database()
+    vectors = get_embedding_service().embed([embedding_text(title, content) for title, content, _ in ARTICLES])
+    with get_db_connection() as conn:
+        conn.executemany('INSERT INTO news (id, title, content, url, embedding) VALUES (?, ?, ?, ?, ?)',
+                         [(i, title, content, url, encode_embedding(vector))
+                          for i, ((title, content, url), vector) in enumerate(zip(ARTICLES, vectors), start=1)])
+        conn.execute(f'PRAGMA user_version = {CHUNKS_VERSION - 1}')
+        conn.commit()
+    index = faiss.IndexFlatIP(EMBED_DIM)
+    index.add(vectors)
+    faiss.write_index(index, INDEX_FILE)
+    with open(LEGACY_MAPPING_FILE, "w") as f:
+        json.dump({str(position): position + 1 for position in range(len(ARTICLES))}, f)
+    reset_index_manager()
+
+
+def test_startup_serves_whole_article_vectors_until_offline_migration(workdir):
+    make_legacy_store()
+
+    initialize_database()
+    with get_db_connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM news_chunks').fetchone()[0] == 0
+        assert conn.execute('PRAGMA user_version').fetchone()[0] < CHUNKS_VERSION
+    manager = get_index_manager()
+    assert (manager.ntotal, manager.labels) == (len(ARTICLES), ARTICLE_LABELS)
+
+    title, content, url = ARTICLES[2]
+    query = f"{embedding_text(title, content)}?"
+    results = fetch_news_from_db(query, top_k=3, query_embedding=get_embedding_service().embed_one(
+        embedding_text(title, content)))
+    assert results[0]["url"] == url
+    assert results[0]["content"] == content
+
+    migrate_to_chunks()
+    with get_db_connection() as conn:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == CHUNKS_VERSION
+        chunks = conn.execute('SELECT COUNT(*) FROM news_chunks').fetchone()[0]
+    assert get_index_manager().ntotal == chunks >= len(ARTICLES)
+    assert get_index_manager().labels == CHUNK_LABELS
+    chunk_embedding = get_embedding_service().embed_one(chunk_embedding_text(title, split_article(content)[0]))
+    assert fetch_news_from_db(query, top_k=3, query_embedding=chunk_embedding)[0]["url"] == url
@@ -0,0 +1,63 @@
+"""FaissIndexManager: индекс, опубликованный другим процессом, не затирается и читается со своими метками."""
+import os
+
+import faiss
+import numpy as np
+
+from embedding_service import EMBED_DIM
+from faiss_index_manager import ARTICLE_LABELS, CHUNK_LABELS, INDEX_FILE, FaissIndexManager
+
+
+def flat_index(ids):
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(EMBED_DIM))
+    vectors = np.random.default_rng(len(ids)).standard_normal((len(ids), EMBED_DIM), dtype=np.float32)
+    index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    return index
+
+
+def index_ids(index):
+    return set(faiss.vector_to_array(index.id_map).tolist())
+
+
+def test_snapshot_picks_up_index_published_elsewhere(workdir):
+    server = FaissIndexManager(check_interval=3600)
+    server.publish(flat_index(range(1, 11)))
+    external = FaissIndexManager(check_interval=3600)
+
+    # Другой процесс (например, init_faiss.py) добавляет 50 векторов
+    externally_added = list(range(100, 150))
+    external.publish(flat_index(list(range(1, 11)) + externally_added))
+
+    # Обновление на сервере копирует snapshot(), не дожидаясь check_interval
+    with server.update_lock:
+        index = faiss.clone_index(server.snapshot())
+        index.add_with_ids(np.ones((1, EMBED_DIM), dtype=np.float32), np.asarray([200], dtype=np.int64))
+        server.publish(index)
+
+    on_disk = index_ids(FaissIndexManager().snapshot())
+    assert set(externally_added) | {200} <= on_disk
+    assert index_ids(server.snapshot()) == on_disk
+
+
+def test_labels_switch_together_with_index(workdir):
+    server = FaissIndexManager(check_interval=0)
+    server.publish(flat_index(range(1, 6)), labels=ARTICLE_LABELS)
+    assert (server.ntotal, server.labels) == (5, ARTICLE_LABELS)
+
+    # Публикация в другом процессе на полпути: файл индекса уже новый, файл меток ещё от прежней версии
+    faiss.write_index(flat_index(range(1, 21)), f"{INDEX_FILE}.tmp")
+    os.replace(f"{INDEX_FILE}.tmp", INDEX_FILE)
+    os.utime(INDEX_FILE, ns=(1, 1))
+    assert FaissIndexManager().ntotal == 0
+    _, ids, labels = server.search(np.ones(EMBED_DIM, dtype=np.float32), 20)
+    assert (int((ids != -1).sum()), labels) == (5, ARTICLE_LABELS)
+
+    FaissIndexManager().publish(flat_index(range(1, 21)), labels=CHUNK_LABELS)
+    _, ids, labels = server.search(np.ones(EMBED_DIM, dtype=np.float32), 20)
+    assert (int((ids != -1).sum()), labels) == (20, CHUNK_LABELS)
+
+
+def test_index_without_labels_file_is_labelled_by_articles(workdir):
+    faiss.write_index(flat_index(range(1, 4)), INDEX_FILE)
+    manager = FaissIndexManager()
+    assert (manager.ntotal, manager.labels) == (3, ARTICLE_LABELS)
@@ -0,0 +1,38 @@
+"""Перестройка индекса FAISS не затирает векторы, опубликованные параллельным save_to_database."""
+import threading
+
+import faiss
+
+import news_db_utils
+from faiss_index_manager import get_index_manager
+from news_db_utils import get_db_connection, initialize_database, initialize_faiss_index, save_to_database
+
+
+def article(i):
+    return {"title": f"Заголовок {i}", "content": f"Текст статьи номер {i}", "url": f"https://example.org/{i}"}
+
+
+def test_rebuild_keeps_vectors_saved_meanwhile(workdir, monkeypatch):
+    initialize_database()
+    save_to_database([article(i) for i in range(5)])
+
+    build_index = news_db_utils.build_index
+    writers = []
+
+    def build_index_with_concurrent_save(*args, **kwargs):
+        # Пока перестройка строит индекс по уже прочитанным фрагментам, другой поток сохраняет статью
+        if not writers:
+            writer = threading.Thread(target=save_to_database, args=([article(5)],))
+            writers.append(writer)
+            writer.start()
+            writer.join(timeout=1)
+        return build_index(*args, **kwargs)
+
+    monkeypatch.setattr(news_db_utils, "build_index", build_index_with_concurrent_save)
+    initialize_faiss_index()
+    writers[0].join()
+
+    with get_db_connection() as conn:
+        chunk_ids = {row[0] for row in conn.execute('SELECT id FROM news_chunks')}
+    index = get_index_manager().snapshot()
+    assert set(faiss.vector_to_array(index.id_map).tolist()) == chunk_ids
@@ -0,0 +1,42 @@
+"""PooledHttpClient: статистика соединений без доступа к внутренностям httpx/httpcore."""
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_client import PooledHttpClient
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_stats_count_reused_connections():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    async def run():
+        client = PooledHttpClient(backoff_factor=0)
+        for _ in range(5):
+            await client.get(f"http://127.0.0.1:{server.server_address[1]}/")
+        stats = client.stats()
+        await client.aclose()
+        return stats
+
+    try:
+        stats = asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+    host = stats["hosts"]["127.0.0.1"]
+    assert (host["requests"], host["connections_opened"], host["in_flight"]) == (5, 1, 0)
+    assert host["connection_reuse_ratio"] == 0.8
+    assert stats["pools"]["default"] == {"max_connections": 20, "max_keepalive_connections": 10}
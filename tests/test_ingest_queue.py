@@ -0,0 +1,28 @@
+"""IngestJobQueue: задания до start() не теряются и не роняют submit."""
+import asyncio
+
+from llama_index.core import Document
+
+from ingest_queue import JOB_DONE, JOB_QUEUED, IngestJobQueue
+
+
+async def fake_search(query, limit):
+    return [Document(text=query, metadata={"title": query, "url": f"https://example.org/{query}"})], {"status": "ok"}
+
+
+def test_submit_before_start_runs_after_start():
+    queue = IngestJobQueue({"ria": fake_search}, workers=1)
+    job = queue.submit("ria", "новости", 3)
+    assert job["status"] == JOB_QUEUED
+    assert queue.submit("ria", "Новости ", 3)["job_id"] == job["job_id"]
+
+    async def run():
+        await queue.start()
+        try:
+            return await queue.wait(job["job_id"], timeout=5)
+        finally:
+            await queue.stop()
+
+    finished = asyncio.run(run())
+    assert finished["status"] == JOB_DONE
+    assert finished["result"]["results"] == [{"title": "новости", "url": "https://example.org/новости"}]
@@ -0,0 +1,40 @@
+"""Длительность потокового ответа в rag_http_request_duration_seconds включает генерацию тела."""
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import rag
+from metrics import HTTP_SECONDS
+
+GENERATION_SECONDS = 0.3
+
+
+async def slow_stream(query, chat_history=None):
+    for token in ("Ответ", " готов"):
+        await asyncio.sleep(GENERATION_SECONDS / 2)
+        yield "token", token
+    yield "sources", []
+
+
+def stream_duration():
+    """(сумма, число) наблюдений для POST /news-chat-stream со статусом 200."""
+    values = {}
+    for line in HTTP_SECONDS.render():
+        if 'path="/news-chat-stream"' in line and 'status="200"' in line and "_bucket" not in line:
+            name, value = line.rsplit(" ", 1)
+            values[name.split("{")[0].rsplit("_", 1)[1]] = float(value)
+    return values.get("sum", 0.0), values.get("count", 0.0)
+
+
+def test_stream_duration_covers_generation(workdir, monkeypatch):
+    monkeypatch.setattr(rag, "setup_settings", lambda: None)
+    monkeypatch.setattr(rag, "shutdown_executors", lambda: None)
+    monkeypatch.setattr(rag, "stream_news_with_llm", slow_stream)
+    before_sum, before_count = stream_duration()
+    with TestClient(rag.app) as client:
+        response = client.post("/news-chat-stream", json={"question": "Газпром"})
+        assert response.status_code == 200
+        assert "event: done" in response.text
+    after_sum, after_count = stream_duration()
+    assert after_count == before_count + 1
+    assert after_sum - before_sum >= GENERATION_SECONDS
@@ -0,0 +1,47 @@
+"""Чат по короткому запросу из ключевых слов ищет по BM25 и не вызывает модель эмбеддингов."""
+import json
+
+from fastapi.testclient import TestClient
+from llama_index.core import Settings
+from llama_index.core.llms.mock import MockLLM
+
+import rag
+from benchmarks.common import FakeEmbedding
+from embedding_service import get_embedding_service
+from news_db_utils import save_to_database
+
+ARTICLE = {
+    "title": "Газпром сократил поставки",
+    "content": "Газпром сообщил о сокращении поставок газа в Европу.",
+    "url": "https://example.org/gazprom",
+}
+
+
+def mock_settings():
+    Settings.llm = MockLLM()
+    Settings.embed_model = FakeEmbedding()
+
+
+def sse_data(text):
+    return [json.loads(line[len("data: "):]) for line in text.splitlines() if line.startswith("data: ")]
+
+
+def test_keyword_chat_skips_embedder(workdir, monkeypatch):
+    monkeypatch.setattr(rag, "setup_settings", mock_settings)
+    # Пулы потоков — синглтоны процесса: остановка приложения не должна гасить их для следующих тестов
+    monkeypatch.setattr(rag, "shutdown_executors", lambda: None)
+    with TestClient(rag.app) as client:
+        save_to_database([ARTICLE])
+        calls = []
+        service = get_embedding_service()
+        embed_one = service.embed_one
+        monkeypatch.setattr(service, "embed_one", lambda text: calls.append(text) or embed_one(text))
+
+        response = client.post("/news-chat", json={"question": "Газпром"})
+        assert response.status_code == 200
+        assert response.json()["sources"] == [ARTICLE["url"]]
+
+        response = client.post("/news-chat-stream", json={"question": "Газпром"})
+        assert response.status_code == 200
+        assert {"sources": [ARTICLE["url"]]} in sse_data(response.text)
+    assert calls == []
@@ -0,0 +1,52 @@
+"""Поиск RIA: страница ошибки не попадает в SEARCH_CACHE."""
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import pars
+from http_client import close_http_client
+
+RESULTS_PAGE = ('<html><body><div class="list-item"><a class="list-item__title" href="https://ria.ru/1.html">'
+                'Заголовок</a></div></body></html>')
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    status = 404
+
+    def do_GET(self):
+        body = RESULTS_PAGE.encode("utf-8") if self.status == 200 else b"error"
+        self.send_response(self.status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_error_page_is_not_cached(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SearchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(pars, "RIA_SEARCH_URL", f"http://127.0.0.1:{server.server_address[1]}/search/")
+    monkeypatch.setattr(pars, "SEARCH_CACHE", pars.TTLCache(ttl=300))
+
+    async def run():
+        try:
+            with pytest.raises(httpx.HTTPStatusError):
+                await pars.get_ria_hits("газ", 3)
+            monkeypatch.setattr(SearchHandler, "status", 200)
+            return await pars.get_ria_hits("газ", 3)
+        finally:
+            await close_http_client()
+
+    try:
+        hits = asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert hits == [("Заголовок", "https://ria.ru/1.html")]
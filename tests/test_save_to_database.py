@@ -0,0 +1,100 @@
+"""save_to_database против прежнего построчного цикла на случайных пакетах."""
+import os
+import random
+import sqlite3
+
+import pytest
+
+from faiss_index_manager import reset_index_manager
+from news_db_utils import get_db_connection, initialize_database, save_to_database
+
+TITLES = [f"T{i}" for i in range(6)]
+URLS = [f"u{i}" for i in range(6)]
+CONTENTS = [f"c{i}" for i in range(3)]
+
+
+def legacy_save(conn, news_data):
+    """Правила прежнего цикла save_to_database, по одной статье (без эмбеддингов)."""
+    for news in news_data:
+        title, content, url = news["title"], news["content"], news["url"]
+        by_title = conn.execute('SELECT id, url FROM news WHERE title = ? ORDER BY id LIMIT 1', (title,)).fetchone()
+        by_url = conn.execute('SELECT id FROM news WHERE url = ?', (url,)).fetchone()
+        if by_title and by_title[1] == url:
+            conn.execute('UPDATE news SET content = ? WHERE id = ?', (content, by_title[0]))
+        elif by_title and by_url:
+            conn.execute('UPDATE news SET title = ?, content = ? WHERE url = ?', (title, content, url))
+        elif by_title:
+            conn.execute('UPDATE news SET content = ?, url = ? WHERE id = ?', (content, url, by_title[0]))
+        elif by_url:
+            conn.execute('UPDATE news SET title = ?, content = ? WHERE url = ?', (title, content, url))
+        else:
+            conn.execute('INSERT INTO news (title, content, url) VALUES (?, ?, ?)', (title, content, url))
+
+
+def random_batch(rng):
+    return [{"title": rng.choice(TITLES), "url": rng.choice(URLS), "content": rng.choice(CONTENTS)}
+            for _ in range(rng.randint(1, 6))]
+
+
+def stored_news(conn):
+    return [tuple(row) for row in conn.execute('SELECT id, title, url, content FROM news ORDER BY id')]
+
+
+def test_set_based_upsert_matches_legacy_loop(workdir):
+    for seed in range(400):
+        rng = random.Random(seed)
+        os.mkdir(workdir / str(seed))
+        os.chdir(workdir / str(seed))
+        reset_index_manager()
+        initialize_database()
+        # Начальное состояние пишет сам save_to_database: у записей есть фрагменты и content_hash
+        save_to_database(random_batch(rng))
+
+        reference = sqlite3.connect(':memory:')
+        reference.execute('CREATE TABLE news (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, '
+                          'content TEXT, url TEXT UNIQUE)')
+        with get_db_connection() as conn:
+            reference.executemany('INSERT INTO news (id, title, url, content) VALUES (?, ?, ?, ?)',
+                                  stored_news(conn))
+
+        for _ in range(3):
+            batch = random_batch(rng)
+            save_to_database(batch)
+            legacy_save(reference, batch)
+            with get_db_connection() as conn:
+                assert stored_news(conn) == stored_news(reference), f"seed {seed}, batch {batch}"
+                # У каждой статьи с текстом есть фрагменты текущей версии
+                assert conn.execute('''SELECT COUNT(*) FROM news WHERE NOT EXISTS
+                                       (SELECT 1 FROM news_chunks WHERE news_chunks.news_id = news.id)''').fetchone()[0] == 0
+
+
+@pytest.mark.parametrize("stored, batch", [
+    # Цепочка и обмен url внутри пакета: UPDATE не должен занять ещё не освобождённый url
+    ([(1, "T0", "u0"), (2, "T4", "u4"), (3, "T1", "u1"), (4, "T3", "u2")],
+     [("T4", "u3"), ("T3", "u5"), ("T1", "u4"), ("T4", "u2")]),
+    ([(1, "T0", "u0"), (2, "T1", "u1")],
+     [("T0", "u2"), ("T1", "u0"), ("T0", "u1")]),
+])
+def test_url_chains_and_swaps(workdir, stored, batch):
+    initialize_database()
+    reference = sqlite3.connect(':memory:')
+    reference.execute('CREATE TABLE news (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, '
+                      'content TEXT, url TEXT UNIQUE)')
+    with get_db_connection() as conn:
+        for db in (conn, reference):
+            db.executemany('INSERT INTO news (id, title, url, content) VALUES (?, ?, ?, ?)',
+                           [(*row, "c0") for row in stored])
+        conn.commit()
+    news_data = [{"title": title, "url": url, "content": "c1"} for title, url in batch]
+    save_to_database(news_data)
+    legacy_save(reference, news_data)
+    with get_db_connection() as conn:
+        assert stored_news(conn) == stored_news(reference)
+
+
+def test_repeated_url_keeps_last_copy(workdir):
+    initialize_database()
+    save_to_database([{"title": "T0", "url": "u4", "content": "c0"}])
+    save_to_database([{"title": "T0", "url": "u4", "content": "c1"}, {"title": "T0", "url": "u4", "content": "c0"}])
+    with get_db_connection() as conn:
+        assert stored_news(conn) == [(1, "T0", "u4", "c0")]